@@ -3,31 +3,80 @@ FocusFlow-AI Backend
 =======================================
 """
 
-from flask import Flask, request, jsonify, send_from_directory
+from flask import Flask, Response, abort, request, jsonify, make_response, stream_with_context
+from flask.json.provider import DefaultJSONProvider
 from flask_cors import CORS
 import sqlite3
 import json
+import hashlib
+import gzip
+import importlib.util
+import math
+import mimetypes
+import re
 import os
 import logging
-from datetime import datetime, timedelta
+import asyncio
+import threading
+import time
+from collections import OrderedDict, deque
+from datetime import date, datetime, timedelta
 from functools import wraps
 from contextlib import contextmanager
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from concurrent.futures import TimeoutError as FutureTimeout
+from queue import Empty, Queue
 
 # Try to import AI libraries
 try:
     import google.generativeai as genai
     GEMINI_AVAILABLE = True
+    # response_mime_type (JSON mode) arrived in later SDK releases
+    GEMINI_JSON_MODE_AVAILABLE = 'response_mime_type' in genai.GenerationConfig.__dataclass_fields__
 except ImportError:
     GEMINI_AVAILABLE = False
+    GEMINI_JSON_MODE_AVAILABLE = False
     print(" google-generativeai not installed. Run: pip install google-generativeai")
 
 try:
-    from groq import Groq
+    from groq import Groq, AsyncGroq
     GROQ_AVAILABLE = True
 except ImportError:
     GROQ_AVAILABLE = False
     print(" groq not installed. Run: pip install groq")
 
+try:
+    import httpx
+    HTTP2_AVAILABLE = importlib.util.find_spec('h2') is not None
+except ImportError:
+    httpx = None
+    HTTP2_AVAILABLE = False
+
+# Optional fast JSON encoding and brotli response compression
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+    # Same output as Flask's default provider: sorted keys, and datetimes
+    # go through its fallback (HTTP dates) rather than orjson's ISO format
+    ORJSON_OPTIONS = orjson.OPT_SORT_KEYS | orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME
+except ImportError:
+    ORJSON_AVAILABLE = False
+
+try:
+    import brotli
+    BROTLI_AVAILABLE = True
+except ImportError:
+    BROTLI_AVAILABLE = False
+
+# Optional ASGI serving mode
+try:
+    from asgiref.sync import sync_to_async
+    from asgiref.wsgi import WsgiToAsgiInstance
+    import uvicorn
+    ASGI_AVAILABLE = True
+except ImportError:
+    ASGI_AVAILABLE = False
+
 # ================================
 # LOGGING
 # ================================
@@ -43,26 +92,143 @@ logger = logging.getLogger(__name__)
 # ================================
 
 class Config:
-    DATABASE = 'focusflow.db'
+    DATABASE = os.getenv('DATABASE', 'focusflow.db')
+    
+    # SQLite profile, applied to every new connection
+    SQLITE_PRAGMAS = {
+        'journal_mode': os.getenv('SQLITE_JOURNAL_MODE', 'WAL'),
+        'synchronous': os.getenv('SQLITE_SYNCHRONOUS', 'NORMAL'),
+        'busy_timeout': int(os.getenv('SQLITE_BUSY_TIMEOUT', 5000)),    # ms
+        'cache_size': int(os.getenv('SQLITE_CACHE_SIZE', -16000)),      # negative = KiB
+        'mmap_size': int(os.getenv('SQLITE_MMAP_SIZE', 64 * 1024 * 1024)),
+        'temp_store': os.getenv('SQLITE_TEMP_STORE', 'MEMORY'),
+    }
     
     # Check for API keys
     GEMINI_API_KEY = os.getenv('GEMINI_API_KEY')
     GROQ_API_KEY = os.getenv('GROQ_API_KEY')
     
-    # Determine AI provider
-    AI_PROVIDER = None
-    AI_MODEL = None
+    DEFAULT_MODELS = {
+        'gemini': 'gemini-2.5-flash',
+        'groq': 'llama3-8b-8192',
+        'stub': 'echo',
+    }
+    
+    # Determine AI providers: comma-separated 'gemini', 'groq', 'stub' (offline),
+    # else auto-detect from API keys. The first is primary; the rest are
+    # hedge/failover targets.
+    AI_PROVIDERS = [p.strip() for p in os.getenv('AI_PROVIDERS', os.getenv('AI_PROVIDER', '')).split(',') if p.strip()]
     
-    if GEMINI_API_KEY and GEMINI_AVAILABLE:
-        AI_PROVIDER = 'gemini'
-        AI_MODEL = 'gemini-2.5-flash'
-    elif GROQ_API_KEY and GROQ_AVAILABLE:
-        AI_PROVIDER = 'groq'
-        AI_MODEL = 'llama3-8b-8192'
+    if not AI_PROVIDERS:
+        if GEMINI_API_KEY and GEMINI_AVAILABLE:
+            AI_PROVIDERS.append('gemini')
+        if GROQ_API_KEY and GROQ_AVAILABLE:
+            AI_PROVIDERS.append('groq')
+    
+    AI_PROVIDER = AI_PROVIDERS[0] if AI_PROVIDERS else None
+    AI_MODEL = os.getenv('AI_MODEL') or DEFAULT_MODELS.get(AI_PROVIDER)  # primary's model
     
     AI_ENABLED = AI_PROVIDER is not None
     
+    # Multi-provider routing: send a hedge request to the next provider if the
+    # current one hasn't answered after AI_HEDGE_AFTER seconds (0 disables)
+    AI_HEDGE_AFTER = float(os.getenv('AI_HEDGE_AFTER', 2.5))
+    AI_ROUTER_WORKERS = int(os.getenv('AI_ROUTER_WORKERS', 64))
+    
+    # Circuit breakers: open after AI_FAILURE_THRESHOLD consecutive failures,
+    # allow AI_HALF_OPEN_PROBES trial calls after AI_COOLDOWN seconds
+    AI_FAILURE_THRESHOLD = int(os.getenv('AI_FAILURE_THRESHOLD', 3))
+    AI_COOLDOWN = float(os.getenv('AI_COOLDOWN', 30))
+    AI_HALF_OPEN_PROBES = int(os.getenv('AI_HALF_OPEN_PROBES', 1))
+    
+    # Overall time budget per AI request before falling back, in seconds.
+    # For streams it bounds the wait for each chunk, including the first.
+    AI_CHAT_DEADLINE = float(os.getenv('AI_CHAT_DEADLINE', 10))
+    AI_SCHEDULE_DEADLINE = float(os.getenv('AI_SCHEDULE_DEADLINE', 30))
+    AI_WORKERS = int(os.getenv('AI_WORKERS', 64))
+    
+    # Schedule generation: use the provider's native JSON output mode when
+    # the SDK supports it, and cap output at AI_SCHEDULE_MAX_TOKENS
+    AI_JSON_MODE = os.getenv('AI_JSON_MODE', 'true').lower() == 'true'
+    AI_SCHEDULE_MAX_TOKENS = int(os.getenv('AI_SCHEDULE_MAX_TOKENS', 1200))
+    AI_SCHEDULE_TEMPERATURE = float(os.getenv('AI_SCHEDULE_TEMPERATURE', 0.3))
+    
+    # Simulated generation time for the stub provider, in seconds
+    STUB_AI_LATENCY = float(os.getenv('STUB_AI_LATENCY', 0))
+    
+    # AI client transport (Groq's httpx client)
+    AI_HTTP_POOL_SIZE = int(os.getenv('AI_HTTP_POOL_SIZE', 20))
+    AI_HTTP_KEEPALIVE = int(os.getenv('AI_HTTP_KEEPALIVE', 10))                 # idle connections kept open
+    AI_HTTP_KEEPALIVE_EXPIRY = float(os.getenv('AI_HTTP_KEEPALIVE_EXPIRY', 30))  # seconds
+    AI_HTTP2 = os.getenv('AI_HTTP2', '1') == '1'                                # needs the h2 package
+    AI_CONNECT_TIMEOUT = float(os.getenv('AI_CONNECT_TIMEOUT', 5))
+    AI_READ_TIMEOUT = float(os.getenv('AI_READ_TIMEOUT', 60))
+    AI_MAX_RETRIES = int(os.getenv('AI_MAX_RETRIES', 2))
+    # Gemini: 'grpc' (default, one multiplexed HTTP/2 channel) or 'rest'
+    GEMINI_TRANSPORT = os.getenv('GEMINI_TRANSPORT')
+    
     PORT = int(os.getenv('PORT', 5000))
+    
+    # 'wsgi' (Flask threaded server) or 'asgi' (uvicorn, async AI routes)
+    SERVER_MODE = os.getenv('SERVER_MODE', 'wsgi')
+    
+    # Threads serving the Flask (non-native) routes in ASGI mode
+    ASGI_WSGI_THREADS = int(os.getenv('ASGI_WSGI_THREADS', 32))
+    
+    # Max in-flight AI calls per provider in ASGI mode
+    AI_MAX_CONCURRENCY = {
+        'gemini': int(os.getenv('GEMINI_MAX_CONCURRENCY', 256)),
+        'groq': int(os.getenv('GROQ_MAX_CONCURRENCY', 256)),
+        'stub': int(os.getenv('STUB_MAX_CONCURRENCY', 10000)),
+    }
+    
+    # Connection pool
+    DB_POOL_SIZE = int(os.getenv('DB_POOL_SIZE', 8))
+    DB_POOL_TIMEOUT = float(os.getenv('DB_POOL_TIMEOUT', 5))
+    DB_POOL_MAX_IDLE = float(os.getenv('DB_POOL_MAX_IDLE', 300))
+    DB_POOL_HEALTHCHECK_AFTER = float(os.getenv('DB_POOL_HEALTHCHECK_AFTER', 30))
+    
+    # In-process caches
+    USER_CACHE_SIZE = int(os.getenv('USER_CACHE_SIZE', 10000))
+    CHAT_BUFFER_USERS = int(os.getenv('CHAT_BUFFER_USERS', 10000))
+    CHAT_CONTEXT_MESSAGES = 10  # recent messages kept per user, current one included
+    
+    # Chat prompt compaction: verbatim history is trimmed to AI_CONTEXT_TOKENS (estimated)
+    # and older turns are folded into a rolling summary capped at AI_SUMMARY_MAX_CHARS
+    AI_CONTEXT_TOKENS = int(os.getenv('AI_CONTEXT_TOKENS', 1200))
+    AI_SUMMARY_MAX_CHARS = int(os.getenv('AI_SUMMARY_MAX_CHARS', 1200))
+    
+    # Bulk schedule import
+    IMPORT_MAX_SCHEDULES = int(os.getenv('IMPORT_MAX_SCHEDULES', 500))
+    
+    # AI schedule cache (persisted in SQLite)
+    SCHEDULE_CACHE_TTL = int(os.getenv('SCHEDULE_CACHE_TTL', 7 * 24 * 3600))  # seconds
+    SCHEDULE_CACHE_MAX_ENTRIES = int(os.getenv('SCHEDULE_CACHE_MAX_ENTRIES', 5000))
+    
+    # Schedule generation jobs: SCHEDULE_JOB_WORKERS bounds concurrent
+    # generations, synchronous POSTs included, so it defaults to AI_WORKERS;
+    # lower it to protect a rate-limited provider at the cost of queueing.
+    # One worker polls SQLite every SCHEDULE_JOB_POLL seconds for jobs
+    # queued by other processes
+    SCHEDULE_JOB_WORKERS = int(os.getenv('SCHEDULE_JOB_WORKERS', AI_WORKERS))
+    SCHEDULE_JOB_POLL = float(os.getenv('SCHEDULE_JOB_POLL', 2))
+    SCHEDULE_JOB_MAX_ATTEMPTS = int(os.getenv('SCHEDULE_JOB_MAX_ATTEMPTS', 2))
+    SCHEDULE_JOB_RECOVER_INTERVAL = float(os.getenv('SCHEDULE_JOB_RECOVER_INTERVAL', 30))  # stale-job sweep
+    SCHEDULE_JOB_MAX_WAIT = float(os.getenv('SCHEDULE_JOB_MAX_WAIT', 30))  # longest status long-poll
+    
+    # Response pipeline: JSON_PROVIDER is 'orjson' (used when installed) or
+    # 'std'; text bodies of COMPRESS_MIN_SIZE bytes or more are compressed
+    # with brotli (when installed) or gzip, whichever the client accepts
+    JSON_PROVIDER = os.getenv('JSON_PROVIDER', 'orjson')
+    COMPRESS_MIN_SIZE = int(os.getenv('COMPRESS_MIN_SIZE', 1024))
+    GZIP_LEVEL = int(os.getenv('GZIP_LEVEL', 6))
+    BROTLI_QUALITY = int(os.getenv('BROTLI_QUALITY', 4))
+    
+    # Frontend files the app serves (any other path is a 404). They are held
+    # in memory with fingerprinted URLs cached for STATIC_MAX_AGE seconds.
+    STATIC_FILES = [f.strip() for f in os.getenv('STATIC_FILES', 'index.html,script.js,styles.css').split(',')
+                    if f.strip()]
+    STATIC_MAX_AGE = int(os.getenv('STATIC_MAX_AGE', 365 * 24 * 3600))
 
 config = Config()
 
@@ -70,67 +236,299 @@ config = Config()
 # FLASK APP
 # ================================
 
-app = Flask(__name__, static_folder='.')
+app = Flask(__name__, static_folder=None)  # frontend files go through StaticAssets
 CORS(app)
 
-# Initialize AI
-ai_client = None
+class OrjsonProvider(DefaultJSONProvider):
+    """Flask JSON provider backed by orjson, with the default provider's output"""
+    
+    def dumps(self, obj, **kwargs):
+        return self.encode(obj).decode()
+    
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+    
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(self.encode(obj), mimetype=self.mimetype)
+    
+    def encode(self, obj):
+        return orjson.dumps(obj, default=self.default, option=ORJSON_OPTIONS)
 
-if config.AI_PROVIDER == 'gemini':
-    try:
-        genai.configure(api_key=config.GEMINI_API_KEY)
-        ai_client = genai.GenerativeModel('gemini-2.5-flash')
-        logger.info("/ AI: Google Gemini (FREE)")
-    except Exception as e:
-        logger.error(f"Gemini setup failed: {e}")
-        config.AI_ENABLED = False
+if config.JSON_PROVIDER == 'orjson' and ORJSON_AVAILABLE:
+    app.json = OrjsonProvider(app)
 
-elif config.AI_PROVIDER == 'groq':
-    try:
-        ai_client = Groq(api_key=config.GROQ_API_KEY)
-        logger.info("/ AI: Groq (FREE)")
-    except Exception as e:
-        logger.error(f"Groq setup failed: {e}")
-        config.AI_ENABLED = False
+class Counters:
+    """Thread-safe named counters reported by /api/health.
+    
+    add() increments counters, except max_* ones, which keep the largest
+    value seen. Each ratio name=(numerator, denominator, digits) is
+    reported alongside the counts.
+    """
+    
+    def __init__(self, *names, **ratios):
+        self._lock = threading.Lock()
+        self.counts = dict.fromkeys(names, 0)
+        self.ratios = ratios
+    
+    def add(self, **amounts):
+        with self._lock:
+            for name, amount in amounts.items():
+                if name.startswith('max_'):
+                    self.counts[name] = max(self.counts[name], amount)
+                else:
+                    self.counts[name] += amount
+    
+    def stats(self):
+        with self._lock:
+            stats = dict(self.counts)
+        for name, (numerator, denominator, digits) in self.ratios.items():
+            stats[name] = round(stats[numerator] / stats[denominator], digits) if stats[denominator] else 0
+        return stats
 
-if not config.AI_ENABLED:
-    logger.info("/ AI: Fallback mode (no API needed)")
+COMPRESSIBLE_TYPES = {'application/json', 'text/html', 'text/css', 'text/plain',
+                      'text/javascript', 'application/javascript'}
+
+def compress_body(body, encoding):
+    if encoding == 'br':
+        return brotli.compress(body, quality=config.BROTLI_QUALITY)
+    return gzip.compress(body, compresslevel=config.GZIP_LEVEL, mtime=0)
+
+def negotiate_encoding(accept_encodings):
+    """Best content coding the client accepts: br, then gzip; None for identity"""
+    if BROTLI_AVAILABLE and accept_encodings['br']:
+        return 'br'
+    if accept_encodings['gzip']:
+        return 'gzip'
+    return None
+
+# Bytes before and after response compression
+compression_stats = Counters('responses', 'bytes_in', 'bytes_out', ratio=('bytes_out', 'bytes_in', 3))
+
+@app.after_request
+def compress_response(response):
+    """Compress buffered text responses of at least COMPRESS_MIN_SIZE bytes.
+    
+    Streams (SSE) and file responses pass through untouched.
+    """
+    if (response.direct_passthrough or response.is_streamed
+            or not 200 <= response.status_code < 300
+            or 'Content-Encoding' in response.headers
+            or response.mimetype not in COMPRESSIBLE_TYPES):
+        return response
+    
+    response.vary.add('Accept-Encoding')
+    encoding = negotiate_encoding(request.accept_encodings)
+    body = response.get_data()
+    if encoding is None or len(body) < config.COMPRESS_MIN_SIZE:
+        return response
+    
+    compressed = compress_body(body, encoding)
+    response.set_data(compressed)
+    response.headers['Content-Encoding'] = encoding
+    compression_stats.add(responses=1, bytes_in=len(body), bytes_out=len(compressed))
+    return response
 
 # ================================
 # DATABASE
 # ================================
 
-@contextmanager
-def get_db():
-    conn = sqlite3.connect(config.DATABASE)
+class ConnectionPool:
+    """Bounded pool of SQLite connections.
+    
+    Idle connections are kept in a LIFO stack so the warmest one is reused
+    first. A thread that re-enters get_db() while already holding a
+    connection gets the same one back, and a thread prefers the connection
+    it released last. Connections idle longer than max_idle are closed, and
+    ones idle longer than healthcheck_after are probed before reuse.
+    """
+    
+    def __init__(self, connect, max_size, timeout, max_idle, healthcheck_after):
+        self._connect = connect
+        self.max_size = max_size
+        self.timeout = timeout
+        self.max_idle = max_idle
+        self.healthcheck_after = healthcheck_after
+        self._idle = deque()  # (conn, released_at)
+        self._size = 0
+        self._cond = threading.Condition()
+        self._local = threading.local()
+        self._stats = {'created': 0, 'reused': 0, 'closed': 0, 'evicted': 0,
+                       'health_failures': 0, 'waits': 0, 'timeouts': 0}
+    
+    def _close(self, conn):
+        try:
+            conn.close()
+        except sqlite3.Error:
+            pass
+        self._size -= 1
+        self._stats['closed'] += 1
+    
+    def _evict_expired(self, now):
+        # Oldest releases sit at the left of the deque
+        while self._idle and now - self._idle[0][1] > self.max_idle:
+            conn, _ = self._idle.popleft()
+            self._close(conn)
+            self._stats['evicted'] += 1
+    
+    def _take_idle(self):
+        preferred = getattr(self._local, 'last', None)
+        if preferred is not None:
+            for i, (conn, released_at) in enumerate(self._idle):
+                if conn is preferred:
+                    del self._idle[i]
+                    return conn, released_at
+        return self._idle.pop()
+    
+    def _healthy(self, conn):
+        try:
+            conn.execute('SELECT 1').fetchone()
+            return True
+        except sqlite3.Error:
+            return False
+    
+    def acquire(self):
+        deadline = time.monotonic() + self.timeout
+        with self._cond:
+            while True:
+                now = time.monotonic()
+                self._evict_expired(now)
+                
+                if self._idle:
+                    conn, released_at = self._take_idle()
+                    if now - released_at > self.healthcheck_after and not self._healthy(conn):
+                        self._stats['health_failures'] += 1
+                        self._close(conn)
+                        continue
+                    self._stats['reused'] += 1
+                    return conn
+                
+                if self._size < self.max_size:
+                    self._size += 1
+                    break
+                
+                remaining = deadline - now
+                if remaining <= 0:
+                    self._stats['timeouts'] += 1
+                    raise sqlite3.OperationalError('connection pool exhausted')
+                self._stats['waits'] += 1
+                self._cond.wait(remaining)
+        
+        # Open the new connection outside the lock
+        try:
+            conn = self._connect()
+        except Exception:
+            with self._cond:
+                self._size -= 1
+                self._cond.notify()
+            raise
+        with self._cond:
+            self._stats['created'] += 1
+        return conn
+    
+    def release(self, conn, discard=False):
+        with self._cond:
+            if discard:
+                self._close(conn)
+            else:
+                self._idle.append((conn, time.monotonic()))
+                self._local.last = conn
+            self._cond.notify()
+    
+    @contextmanager
+    def connection(self):
+        """Yield a pooled connection, reusing the thread's current one if nested"""
+        held = getattr(self._local, 'held', None)
+        if held is not None:
+            self._local.depth += 1
+            try:
+                yield held
+            finally:
+                self._local.depth -= 1
+            return
+        
+        conn = self.acquire()
+        self._local.held = conn
+        self._local.depth = 0
+        discard = False
+        try:
+            yield conn
+            conn.commit()
+        except Exception:
+            try:
+                conn.rollback()
+            except sqlite3.Error:
+                discard = True
+            raise
+        finally:
+            self._local.held = None
+            self.release(conn, discard)
+    
+    def close_all(self):
+        with self._cond:
+            while self._idle:
+                conn, _ = self._idle.pop()
+                self._close(conn)
+    
+    def stats(self):
+        with self._cond:
+            return {
+                'size': self._size,
+                'idle': len(self._idle),
+                'in_use': self._size - len(self._idle),
+                'max_size': self.max_size,
+                **self._stats
+            }
+
+def apply_sqlite_profile(conn, pragmas):
+    """Apply PRAGMA settings to a fresh connection"""
+    for name, value in pragmas.items():
+        conn.execute(f'PRAGMA {name} = {value}')
+
+def _connect():
+    busy_timeout = config.SQLITE_PRAGMAS.get('busy_timeout', 5000) / 1000
+    conn = sqlite3.connect(config.DATABASE, timeout=busy_timeout, check_same_thread=False)
     conn.row_factory = sqlite3.Row
-    try:
-        yield conn
-        conn.commit()
-    except Exception:
-        conn.rollback()
-        raise
-    finally:
-        conn.close()
+    apply_sqlite_profile(conn, config.SQLITE_PRAGMAS)
+    return conn
 
-def init_db():
+db_pool = ConnectionPool(
+    _connect,
+    max_size=config.DB_POOL_SIZE,
+    timeout=config.DB_POOL_TIMEOUT,
+    max_idle=config.DB_POOL_MAX_IDLE,
+    healthcheck_after=config.DB_POOL_HEALTHCHECK_AFTER
+)
+
+def get_db():
+    return db_pool.connection()
+
+@contextmanager
+def write_transaction():
+    """get_db() that takes the write lock up front, for read-modify-write paths"""
     with get_db() as db:
-        cursor = db.cursor()
-        
-        cursor.execute('''CREATE TABLE IF NOT EXISTS users (
+        if not db.in_transaction:
+            db.execute('BEGIN IMMEDIATE')
+        yield db
+
+# Ordered schema migrations: (version, description, statements).
+# migrate() applies each migration atomically in its own BEGIN IMMEDIATE
+# transaction, so a failed migration leaves no partial changes and the
+# statements need not be idempotent.
+MIGRATIONS = [
+    (1, 'initial schema', [
+        '''CREATE TABLE IF NOT EXISTS users (
             id INTEGER PRIMARY KEY AUTOINCREMENT,
             username TEXT UNIQUE NOT NULL,
             created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-        )''')
-        
-        cursor.execute('''CREATE TABLE IF NOT EXISTS schedules (
+        )''',
+        '''CREATE TABLE IF NOT EXISTS schedules (
             id INTEGER PRIMARY KEY AUTOINCREMENT,
             user_id INTEGER NOT NULL,
             week_start DATE NOT NULL,
             created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-        )''')
-        
-        cursor.execute('''CREATE TABLE IF NOT EXISTS study_blocks (
+        )''',
+        '''CREATE TABLE IF NOT EXISTS study_blocks (
             id INTEGER PRIMARY KEY AUTOINCREMENT,
             schedule_id INTEGER NOT NULL,
             day_of_week INTEGER NOT NULL,
@@ -140,9 +538,8 @@ def init_db():
             topic TEXT,
             priority TEXT DEFAULT 'medium',
             completed BOOLEAN DEFAULT 0
-        )''')
-        
-        cursor.execute('''CREATE TABLE IF NOT EXISTS goals (
+        )''',
+        '''CREATE TABLE IF NOT EXISTS goals (
             id INTEGER PRIMARY KEY AUTOINCREMENT,
             user_id INTEGER NOT NULL,
             title TEXT NOT NULL,
@@ -151,23 +548,189 @@ def init_db():
             parent_id INTEGER,
             priority TEXT DEFAULT 'medium',
             completed BOOLEAN DEFAULT 0
-        )''')
-        
-        cursor.execute('''CREATE TABLE IF NOT EXISTS chat_history (
+        )''',
+        '''CREATE TABLE IF NOT EXISTS chat_history (
             id INTEGER PRIMARY KEY AUTOINCREMENT,
             user_id INTEGER NOT NULL,
             role TEXT NOT NULL,
             content TEXT NOT NULL,
             timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-        )''')
-        
-        cursor.execute('''CREATE TABLE IF NOT EXISTS workflows (
+        )''',
+        '''CREATE TABLE IF NOT EXISTS workflows (
             id INTEGER PRIMARY KEY AUTOINCREMENT,
             user_id INTEGER NOT NULL,
             workflow_text TEXT NOT NULL,
             generated_schedule_id INTEGER,
             created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-        )''')
+        )''',
+    ]),
+    (2, 'secondary indexes for per-user lookups', [
+        'CREATE INDEX IF NOT EXISTS idx_chat_history_user_ts ON chat_history (user_id, timestamp)',
+        'CREATE INDEX IF NOT EXISTS idx_schedules_user_week ON schedules (user_id, week_start)',
+        'CREATE INDEX IF NOT EXISTS idx_study_blocks_schedule ON study_blocks (schedule_id, day_of_week, start_time)',
+        'CREATE INDEX IF NOT EXISTS idx_goals_user_parent ON goals (user_id, parent_id)',
+        'CREATE INDEX IF NOT EXISTS idx_workflows_user ON workflows (user_id)',
+    ]),
+    (3, 'AI schedule cache', [
+        '''CREATE TABLE IF NOT EXISTS schedule_cache (
+            cache_key TEXT PRIMARY KEY,
+            schedule_json TEXT NOT NULL,
+            created_at REAL NOT NULL,
+            last_used REAL NOT NULL,
+            hits INTEGER DEFAULT 0
+        )''',
+        'CREATE INDEX IF NOT EXISTS idx_schedule_cache_last_used ON schedule_cache (last_used)',
+    ]),
+    (4, 'keyset index for chat history pagination', [
+        'CREATE INDEX IF NOT EXISTS idx_chat_history_user_id ON chat_history (user_id, id)',
+        'DROP INDEX IF EXISTS idx_chat_history_user_ts',
+    ]),
+    (5, 'rolling chat summaries', [
+        '''CREATE TABLE IF NOT EXISTS chat_summaries (
+            user_id INTEGER PRIMARY KEY,
+            summary TEXT NOT NULL,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )''',
+    ]),
+    (6, 'schedule generation jobs', [
+        '''CREATE TABLE IF NOT EXISTS schedule_jobs (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER NOT NULL,
+            workflow_id INTEGER NOT NULL,
+            workflow_text TEXT NOT NULL,
+            status TEXT NOT NULL DEFAULT 'queued',
+            attempts INTEGER NOT NULL DEFAULT 0,
+            schedule_id INTEGER,
+            result TEXT,
+            error TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            started_at TIMESTAMP,
+            finished_at TIMESTAMP,
+            FOREIGN KEY (user_id) REFERENCES users(id)
+        )''',
+        'CREATE INDEX IF NOT EXISTS idx_schedule_jobs_status ON schedule_jobs(status, id)',
+        'CREATE INDEX IF NOT EXISTS idx_schedule_jobs_user_id ON schedule_jobs(user_id)',
+    ]),
+    # goals gains created_at (ALTER TABLE cannot add a CURRENT_TIMESTAMP
+    # default, so the table is rebuilt) and a materialized path '/1/5/9/'
+    # plus depth, kept current by triggers, so a subtree is one index range
+    (7, 'goal hierarchy: created_at, materialized path and depth', [
+        '''CREATE TABLE goals_tree (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER NOT NULL,
+            title TEXT NOT NULL,
+            description TEXT,
+            type TEXT DEFAULT 'goal',
+            parent_id INTEGER,
+            priority TEXT DEFAULT 'medium',
+            completed BOOLEAN DEFAULT 0,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            path TEXT NOT NULL DEFAULT '',
+            depth INTEGER NOT NULL DEFAULT 0,
+            FOREIGN KEY (user_id) REFERENCES users(id)
+        )''',
+        '''INSERT INTO goals_tree (id, user_id, title, description, type, parent_id, priority, completed, path, depth)
+        WITH RECURSIVE tree(id, user_id, path, depth) AS (
+            SELECT id, user_id, '/' || id || '/', 0 FROM goals
+            WHERE parent_id IS NULL
+               OR parent_id NOT IN (SELECT p.id FROM goals p WHERE p.user_id = goals.user_id)
+            UNION ALL
+            SELECT g.id, g.user_id, t.path || g.id || '/', t.depth + 1
+            FROM goals g JOIN tree t ON g.parent_id = t.id AND g.user_id = t.user_id
+        )
+        SELECT g.id, g.user_id, g.title, g.description, g.type,
+               CASE WHEN t.depth = 0 THEN NULL ELSE g.parent_id END,
+               g.priority, g.completed, t.path, t.depth
+        FROM goals g JOIN tree t ON t.id = g.id''',
+        # Goals not reachable from a root sit on a parent_id cycle; keep them as roots
+        '''INSERT INTO goals_tree (id, user_id, title, description, type, parent_id, priority, completed, path, depth)
+        SELECT id, user_id, title, description, type, NULL, priority, completed, '/' || id || '/', 0
+        FROM goals WHERE id NOT IN (SELECT id FROM goals_tree)''',
+        'DROP TABLE goals',
+        'ALTER TABLE goals_tree RENAME TO goals',
+        'CREATE INDEX IF NOT EXISTS idx_goals_user_parent ON goals (user_id, parent_id)',
+        'CREATE INDEX IF NOT EXISTS idx_goals_user_path ON goals (user_id, path)',
+        '''CREATE TRIGGER IF NOT EXISTS goals_path_insert AFTER INSERT ON goals BEGIN
+            UPDATE goals SET
+                path = COALESCE((SELECT p.path FROM goals p
+                                 WHERE p.id = NEW.parent_id AND p.user_id = NEW.user_id), '/') || NEW.id || '/',
+                depth = COALESCE((SELECT p.depth + 1 FROM goals p
+                                  WHERE p.id = NEW.parent_id AND p.user_id = NEW.user_id), 0)
+            WHERE id = NEW.id;
+        END''',
+        '''CREATE TRIGGER IF NOT EXISTS goals_path_move AFTER UPDATE OF parent_id ON goals
+        WHEN NEW.parent_id IS NOT OLD.parent_id BEGIN
+            UPDATE goals SET
+                path = COALESCE((SELECT p.path FROM goals p
+                                 WHERE p.id = NEW.parent_id AND p.user_id = NEW.user_id), '/')
+                       || NEW.id || '/' || substr(path, length(OLD.path) + 1),
+                depth = depth - OLD.depth + COALESCE((SELECT p.depth + 1 FROM goals p
+                                                      WHERE p.id = NEW.parent_id AND p.user_id = NEW.user_id), 0)
+            WHERE user_id = OLD.user_id AND path >= OLD.path
+              AND path < substr(OLD.path, 1, length(OLD.path) - 1) || '0';
+        END''',
+    ]),
+    # Per-goal roll-ups, kept current by the goal write routes
+    (8, 'goal descendant roll-up counts', [
+        'ALTER TABLE goals ADD COLUMN descendants INTEGER NOT NULL DEFAULT 0',
+        'ALTER TABLE goals ADD COLUMN completed_descendants INTEGER NOT NULL DEFAULT 0',
+        '''UPDATE goals SET
+            descendants = (SELECT COUNT(*) FROM goals d
+                           WHERE d.user_id = goals.user_id AND d.path > goals.path
+                             AND d.path < substr(goals.path, 1, length(goals.path) - 1) || '0'),
+            completed_descendants = (SELECT COALESCE(SUM(d.completed), 0) FROM goals d
+                                     WHERE d.user_id = goals.user_id AND d.path > goals.path
+                                       AND d.path < substr(goals.path, 1, length(goals.path) - 1) || '0')''',
+    ]),
+    (9, 'per-user resource versions for ETags', [
+        '''CREATE TABLE IF NOT EXISTS user_versions (
+            user_id INTEGER NOT NULL,
+            resource TEXT NOT NULL,
+            version INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (user_id, resource)
+        ) WITHOUT ROWID''',
+    ]),
+]
+
+def get_schema_version(db):
+    row = db.execute('SELECT MAX(version) FROM schema_version').fetchone()
+    return row[0] or 0
+
+def migrate(db):
+    """Apply pending migrations, each in its own write transaction.
+    
+    BEGIN IMMEDIATE takes the write lock before the version is re-read, so
+    several processes starting at once apply each migration exactly once
+    while WAL readers keep serving requests.
+    """
+    db.execute('''CREATE TABLE IF NOT EXISTS schema_version (
+        version INTEGER PRIMARY KEY,
+        description TEXT NOT NULL,
+        applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )''')
+    db.commit()
+    
+    for version, description, statements in MIGRATIONS:
+        if version <= get_schema_version(db):
+            continue
+        db.execute('BEGIN IMMEDIATE')
+        try:
+            if version <= get_schema_version(db):
+                db.rollback()
+                continue
+            for statement in statements:
+                db.execute(statement)
+            db.execute('INSERT INTO schema_version (version, description) VALUES (?, ?)',
+                      (version, description))
+            db.commit()
+            logger.info(f"/ DB migration {version}: {description}")
+        except Exception:
+            db.rollback()
+            raise
+
+def init_db():
+    with get_db() as db:
+        migrate(db)
 
 init_db()
 
@@ -178,16 +741,79 @@ init_db()
 def sanitize(text, max_len=1000):
     return (text or "").strip()[:max_len]
 
+class LRUCache:
+    """Thread-safe, size-bounded LRU mapping with hit/miss counters"""
+    
+    def __init__(self, max_size):
+        self.max_size = max_size
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+    
+    def get(self, key, default=None):
+        with self._lock:
+            try:
+                self._data.move_to_end(key)
+            except KeyError:
+                self.misses += 1
+                return default
+            self.hits += 1
+            return self._data[key]
+    
+    def put(self, key, value):
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+                self.evictions += 1
+    
+    def pop(self, key, default=None):
+        with self._lock:
+            return self._data.pop(key, default)
+    
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+    
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'size': len(self._data),
+                'max_size': self.max_size,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_ratio': round(self.hits / lookups, 4) if lookups else 0.0
+            }
+
+user_cache = LRUCache(config.USER_CACHE_SIZE)
+
 def get_or_create_user(username='demo_user'):
     username = sanitize(username, 50) or 'demo_user'
+    user_id = user_cache.get(username)
+    if user_id is not None:
+        return user_id
+    
     with get_db() as db:
         cursor = db.cursor()
         cursor.execute('SELECT id FROM users WHERE username = ?', (username,))
         user = cursor.fetchone()
-        if not user:
-            cursor.execute('INSERT INTO users (username) VALUES (?)', (username,))
-            return cursor.lastrowid
-        return user[0]
+        if user:
+            user_id = user[0]
+        else:
+            # The no-op update makes RETURNING yield the id even if another
+            # request created the user between the SELECT and this INSERT
+            cursor.execute('''INSERT INTO users (username) VALUES (?)
+                ON CONFLICT(username) DO UPDATE SET username = excluded.username
+                RETURNING id''', (username,))
+            user_id = cursor.fetchone()[0]
+    
+    user_cache.put(username, user_id)
+    return user_id
 
 def require_user(f):
     @wraps(f)
@@ -197,116 +823,1124 @@ def require_user(f):
         return f(user_id, *args, **kwargs)
     return decorated
 
-# ================================
-# AI FUNCTIONS
-# ================================
+def bump_version(db, user_id, resource):
+    """Invalidate the user's ETags for resource; call inside the write's transaction"""
+    db.execute('''INSERT INTO user_versions (user_id, resource, version) VALUES (?, ?, 1)
+        ON CONFLICT(user_id, resource) DO UPDATE SET version = version + 1''', (user_id, resource))
+
+def get_version(user_id, resource):
+    with get_db() as db:
+        row = db.execute('SELECT version FROM user_versions WHERE user_id = ? AND resource = ?',
+                         (user_id, resource)).fetchone()
+    return row['version'] if row else 0
+
+# How many conditional-GET requests were answered with 304
+conditional_stats = Counters('requests', 'not_modified')
+
+def conditional(resource, vary=None):
+    """Serve a user's GET route with a weak ETag and answer If-None-Match with 304.
+    
+    The tag hashes the user's version counter for resource, the request
+    path and query, and vary() if given (for content that changes without
+    a write, like the current week). The version is read before the view
+    runs, so a concurrent write can make a tag older than its body, never
+    newer. Goes below @require_user.
+    """
+    def decorator(f):
+        @wraps(f)
+        def decorated(user_id, *args, **kwargs):
+            parts = [resource, str(user_id), str(get_version(user_id, resource)), request.full_path]
+            if vary is not None:
+                parts.append(str(vary()))
+            etag = hashlib.sha1('\x1f'.join(parts).encode()).hexdigest()[:20]
+            
+            not_modified = request.if_none_match.contains_weak(etag)
+            conditional_stats.add(requests=1, not_modified=int(not_modified))
+            if not_modified:
+                response = app.response_class(status=304)
+            else:
+                response = make_response(f(user_id, *args, **kwargs))
+                if response.status_code != 200:
+                    return response
+            response.set_etag(etag, weak=True)
+            response.headers['Cache-Control'] = 'private, no-cache'
+            response.vary.add('X-User')
+            return response
+        return decorated
+    return decorator
+
+# ================================
+# AI PROVIDERS
+# ================================
+
+CHAT_SYSTEM_PROMPT = ("You are FocusFlow AI, a study scheduling assistant for students. "
+                      "Help optimize study schedules with actionable time management advice and "
+                      "effective study techniques. Be encouraging. Keep responses brief (2-3 sentences) "
+                      "unless detail is requested.")
+
+def chat_system_prompt(summary=''):
+    if not summary:
+        return CHAT_SYSTEM_PROMPT
+    return f"{CHAT_SYSTEM_PROMPT}\n\nEarlier in this conversation:\n{summary}"
+
+# Bump when SCHEDULE_PROMPT changes so cached schedules are not reused
+SCHEDULE_PROMPT_VERSION = 2
+
+# Compact wire format: positional rows instead of keyed objects roughly
+# halves the output tokens per study block. validate_schedule() expands it.
+SCHEDULE_PROMPT = """Create a weekly study schedule for the student below. Reply with one JSON object only:
+{{"subjects":[[name,priority,hours_per_week]],"blocks":[[day,start,end,subject,topic,priority]],"tips":[text]}}
+day: 0=Monday..6=Sunday. start/end like "9:00 AM". priority: high, medium or low. 3 tips.
+
+Student workflow:
+{workflow}"""
+
+SCHEDULE_BLOCK_FIELDS = ('day', 'start_time', 'end_time', 'subject', 'topic', 'priority')
+SCHEDULE_SUBJECT_FIELDS = ('name', 'priority', 'hours_per_week')
+
+# Curly double quotes delimit a string only where a straight quote could;
+# inside a straight-quoted string they are content and kept as-is
+_CURLY_QUOTES = '\u201c\u201d'
+_PY_LITERALS = {'True': 'true', 'False': 'false', 'None': 'null'}
+
+def repair_json(text):
+    """Fix common model JSON defects in one pass.
+    
+    Handles curly-quoted strings, // and /* */ comments, trailing commas,
+    raw newlines inside strings, Python literals and truncated output (cut
+    back to the last complete element and closed).
+    """
+    out = []
+    closers = []
+    last_comma = None
+    in_string = escape = False
+    string_end = '"'
+    i = 0
+    while i < len(text):
+        ch = text[i]
+        if in_string:
+            if escape:
+                escape = False
+            elif ch == '\\':
+                escape = True
+            elif ch in string_end:
+                in_string = False
+                ch = '"'
+            elif ch == '\n':
+                ch = '\\n'
+            out.append(ch)
+            i += 1
+            continue
+        if text.startswith('//', i):
+            end = text.find('\n', i)
+            i = len(text) if end == -1 else end
+            continue
+        if text.startswith('/*', i):
+            end = text.find('*/', i + 2)
+            i = len(text) if end == -1 else end + 2
+            continue
+        if ch.isalpha():
+            end = i
+            while end < len(text) and text[end].isalnum():
+                end += 1
+            word = text[i:end]
+            out.append(_PY_LITERALS.get(word, word))
+            i = end
+            continue
+        if ch == '"' or ch in _CURLY_QUOTES:
+            in_string = True
+            string_end = '"' if ch == '"' else '"' + _CURLY_QUOTES
+            ch = '"'
+        elif ch in '{[':
+            closers.append('}' if ch == '{' else ']')
+        elif ch in '}]':
+            while out and out[-1].isspace():
+                out.pop()
+            if out and out[-1] == ',':
+                out.pop()
+            if closers:
+                closers.pop()
+        elif ch == ',':
+            last_comma = (len(out), list(closers))
+        out.append(ch)
+        i += 1
+    
+    if in_string or closers:
+        if last_comma:
+            del out[last_comma[0]:]
+            closers = last_comma[1]
+        elif in_string:
+            out.append('"')
+        out.extend(reversed(closers))
+    return ''.join(out)
+
+class ScheduleJSONExtractor:
+    """Incremental scanner for the first balanced JSON object in model output.
+    
+    feed() accepts the response in chunks (or whole). Prose, code fences
+    and anything after the object are ignored. result() parses what was
+    found, repairing it only if it is not valid JSON, and validates it.
+    """
+    
+    def __init__(self):
+        self.buffer = []
+        self.closers = []
+        self.in_string = self.escape = False
+        self.string_end = '"'
+        self.complete = False
+        self.repaired = False
+    
+    def feed(self, text):
+        for ch in text:
+            if self.complete:
+                break
+            if not self.closers and ch != '{':
+                continue
+            self.buffer.append(ch)
+            if self.in_string:
+                if self.escape:
+                    self.escape = False
+                elif ch == '\\':
+                    self.escape = True
+                elif ch in self.string_end:
+                    self.in_string = False
+                continue
+            if ch == '"' or ch in _CURLY_QUOTES:
+                self.in_string = True
+                self.string_end = '"' if ch == '"' else '"' + _CURLY_QUOTES
+            elif ch in '{[':
+                self.closers.append('}' if ch == '{' else ']')
+            elif ch in '}]':
+                self.closers.pop()
+                self.complete = not self.closers
+    
+    def result(self):
+        """Parsed and validated schedule; raises ValueError when none can be recovered"""
+        if not self.buffer:
+            raise ValueError('No JSON object in response')
+        raw = ''.join(self.buffer)
+        try:
+            data = json.loads(raw)
+        except ValueError:
+            data = json.loads(repair_json(raw))
+            self.repaired = True
+        return validate_schedule(data)
+
+DAY_NAMES = ['monday', 'tuesday', 'wednesday', 'thursday', 'friday', 'saturday', 'sunday']
+PRIORITIES = ('high', 'medium', 'low')
+
+# study_blocks columns, in the order normalized blocks are stored
+STUDY_BLOCK_COLUMNS = ('day', 'start_time', 'end_time', 'subject', 'topic', 'priority')
+
+def normalize_study_block(block):
+    """Coerce one AI or imported study block (object or compact row) to the schedule schema; None if it is unusable"""
+    if isinstance(block, list):
+        block = dict(zip(SCHEDULE_BLOCK_FIELDS, block))
+    if not isinstance(block, dict):
+        return None
+    day = block.get('day', block.get('day_of_week'))
+    if isinstance(day, str) and day.strip().lower()[:3] in [d[:3] for d in DAY_NAMES]:
+        day = [d[:3] for d in DAY_NAMES].index(day.strip().lower()[:3])
+    try:
+        day = int(day)
+    except (TypeError, ValueError):
+        return None
+    start_time = sanitize(str(block.get('start_time') or ''), 20)
+    end_time = sanitize(str(block.get('end_time') or ''), 20)
+    subject = sanitize(str(block.get('subject') or ''), 200)
+    if not (0 <= day <= 6 and start_time and end_time and subject):
+        return None
+    priority = str(block.get('priority') or 'medium').lower()
+    return {
+        'day': day,
+        'start_time': start_time,
+        'end_time': end_time,
+        'subject': subject,
+        'topic': sanitize(str(block.get('topic') or ''), 200),
+        'priority': priority if priority in PRIORITIES else 'medium'
+    }
+
+def validate_schedule(data):
+    """Check a parsed schedule against the expected shape and normalize it.
+    
+    Unusable blocks, subjects and tips are dropped; a schedule with no
+    usable study block raises ValueError so the caller can fall back.
+    """
+    if not isinstance(data, dict):
+        raise ValueError('Schedule must be a JSON object')
+    raw_blocks = data.get('study_blocks', data.get('blocks'))
+    blocks = [b for b in map(normalize_study_block, raw_blocks if isinstance(raw_blocks, list) else []) if b]
+    if not blocks:
+        raise ValueError('Schedule has no usable study blocks')
+    
+    subjects = []
+    for subject in data.get('subjects') or []:
+        if isinstance(subject, list):
+            subject = dict(zip(SCHEDULE_SUBJECT_FIELDS, subject))
+        if not isinstance(subject, dict) or not subject.get('name'):
+            continue
+        priority = str(subject.get('priority') or 'medium').lower()
+        try:
+            hours = float(subject.get('hours_per_week') or 0)
+        except (TypeError, ValueError):
+            hours = 0.0
+        if not math.isfinite(hours):
+            hours = 0.0
+        subjects.append({
+            'name': str(subject['name']).strip(),
+            'priority': priority if priority in PRIORITIES else 'medium',
+            'hours_per_week': int(hours) if hours.is_integer() else hours
+        })
+    
+    recommendations = data.get('recommendations', data.get('tips'))
+    if not isinstance(recommendations, list):
+        recommendations = []
+    return {
+        'subjects': subjects,
+        'study_blocks': blocks,
+        'recommendations': [str(r).strip() for r in recommendations if isinstance(r, (str, int, float))]
+    }
+
+# Schedule responses parsed cleanly, after repair, or not at all
+schedule_parse_stats = Counters('clean', 'repaired', 'failed')
+
+def parse_schedule_json(text):
+    """Extract, repair and validate the schedule in a model response"""
+    extractor = ScheduleJSONExtractor()
+    extractor.feed(text)
+    try:
+        schedule = extractor.result()
+    except ValueError:
+        schedule_parse_stats.add(failed=1)
+        raise
+    schedule_parse_stats.add(**{'repaired' if extractor.repaired else 'clean': 1})
+    return schedule
+
+class LatencyHistogram:
+    """Thread-safe latency histogram with fixed millisecond buckets"""
+    
+    BUCKETS_MS = (25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 30000)
+    
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.counts = [0] * (len(self.BUCKETS_MS) + 1)
+        self.count = 0
+        self.total_ms = 0.0
+    
+    def observe(self, seconds):
+        ms = seconds * 1000
+        index = next((i for i, bound in enumerate(self.BUCKETS_MS) if ms <= bound), len(self.BUCKETS_MS))
+        with self._lock:
+            self.counts[index] += 1
+            self.count += 1
+            self.total_ms += ms
+    
+    def _quantile(self, counts, q):
+        """Upper bound of the bucket containing quantile q ('inf' for the overflow bucket, as in buckets)"""
+        target = q * self.count
+        seen = 0
+        for bound, n in zip(self.BUCKETS_MS + ('inf',), counts):
+            seen += n
+            if seen >= target:
+                return bound
+    
+    def stats(self):
+        with self._lock:
+            counts = list(self.counts)
+            if not self.count:
+                return {'count': 0}
+            return {
+                'count': self.count,
+                'mean_ms': round(self.total_ms / self.count, 1),
+                'p50_ms': self._quantile(counts, 0.5),
+                'p95_ms': self._quantile(counts, 0.95),
+                'p99_ms': self._quantile(counts, 0.99),
+                'buckets': [[bound, n] for bound, n in zip(self.BUCKETS_MS + ('inf',), counts)]
+            }
+
+class CircuitBreaker:
+    """Per-provider circuit breaker.
+    
+    closed: calls pass; failure_threshold consecutive failures open it.
+    open: calls are refused until cooldown seconds have passed.
+    half_open: up to half_open_probes trial calls pass; a success closes
+    the breaker, a failure re-opens it for another cooldown.
+    
+    Every allow() that returns True must be followed by record_success(),
+    record_failure() or release().
+    """
+    
+    CLOSED, OPEN, HALF_OPEN = 'closed', 'open', 'half_open'
+    
+    def __init__(self, failure_threshold, cooldown, half_open_probes=1):
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.half_open_probes = half_open_probes
+        self._lock = threading.Lock()
+        self.state = self.CLOSED
+        self.opened_at = 0.0
+        self.probes_in_flight = 0
+        self.consecutive_failures = 0
+        self.counts = {'successes': 0, 'failures': 0, 'timeouts': 0, 'trips': 0, 'short_circuits': 0}
+    
+    def _refresh(self):
+        if self.state == self.OPEN and time.monotonic() - self.opened_at >= self.cooldown:
+            self.state = self.HALF_OPEN
+            self.probes_in_flight = 0
+    
+    def available(self):
+        """Whether allow() would currently succeed, without reserving a probe"""
+        with self._lock:
+            self._refresh()
+            return self.state == self.CLOSED or (
+                self.state == self.HALF_OPEN and self.probes_in_flight < self.half_open_probes)
+    
+    def allow(self):
+        with self._lock:
+            self._refresh()
+            if self.state == self.CLOSED:
+                return True
+            if self.state == self.HALF_OPEN and self.probes_in_flight < self.half_open_probes:
+                self.probes_in_flight += 1
+                return True
+            self.counts['short_circuits'] += 1
+            return False
+    
+    def record_success(self):
+        with self._lock:
+            self.counts['successes'] += 1
+            self.consecutive_failures = 0
+            if self.state == self.HALF_OPEN:
+                self.state = self.CLOSED
+                self.probes_in_flight = 0
+    
+    def record_failure(self, timeout=False):
+        with self._lock:
+            self.counts['failures'] += 1
+            if timeout:
+                self.counts['timeouts'] += 1
+            self.consecutive_failures += 1
+            if self.state == self.HALF_OPEN or self.consecutive_failures >= self.failure_threshold:
+                if self.state != self.OPEN:
+                    self.counts['trips'] += 1
+                self.state = self.OPEN
+                self.opened_at = time.monotonic()
+                self.probes_in_flight = 0
+    
+    def release(self):
+        """Give back an allowed call that ended without an outcome (e.g. cancelled)"""
+        with self._lock:
+            if self.state == self.HALF_OPEN and self.probes_in_flight:
+                self.probes_in_flight -= 1
+    
+    def stats(self):
+        with self._lock:
+            self._refresh()
+            return {
+                'state': self.state,
+                'consecutive_failures': self.consecutive_failures,
+                **self.counts
+            }
+
+class AIProvider:
+    """Interface every AI backend implements.
+    
+    chat() returns the reply text, stream_chat() yields it in chunks and
+    generate_schedule() returns the parsed schedule dict. achat() is used
+    in ASGI mode; by default it runs the sync call on a thread.
+    Exceptions propagate; the AI FUNCTIONS wrappers log them and fall back.
+    """
+    
+    name = None
+    label = None
+    
+    def __init__(self, config, model=None):
+        self.model = model or config.DEFAULT_MODELS.get(self.name)
+        self.semaphore = asyncio.Semaphore(config.AI_MAX_CONCURRENCY.get(self.name, 256))
+        self.breaker = CircuitBreaker(config.AI_FAILURE_THRESHOLD, config.AI_COOLDOWN, config.AI_HALF_OPEN_PROBES)
+        self._latency = {}
+        self._latency_lock = threading.Lock()
+    
+    def observe(self, metric, seconds):
+        """Record a latency sample, e.g. ('chat.total', 1.2)"""
+        histogram = self._latency.get(metric)
+        if histogram is None:
+            with self._latency_lock:
+                histogram = self._latency.setdefault(metric, LatencyHistogram())
+        histogram.observe(seconds)
+    
+    def latency_stats(self):
+        return {metric: h.stats() for metric, h in sorted(self._latency.items())}
+    
+    def status(self):
+        return {'model': self.model, 'breaker': self.breaker.stats()}
+    
+    def chat(self, message, history, summary=''):
+        raise NotImplementedError
+    
+    def stream_chat(self, message, history, summary=''):
+        yield self.chat(message, history, summary)
+    
+    def generate_schedule(self, workflow):
+        raise NotImplementedError
+    
+    async def achat(self, message, history, summary=''):
+        return await asyncio.to_thread(self.chat, message, history, summary)
+
+class GeminiProvider(AIProvider):
+    name = 'gemini'
+    label = 'Google Gemini (FREE)'
+    
+    def __init__(self, config, model=None):
+        super().__init__(config, model)
+        # The SDK shares one default gRPC channel per process; only pass a
+        # transport when one is configured so ASGI mode keeps grpc_asyncio
+        options = {'transport': config.GEMINI_TRANSPORT} if config.GEMINI_TRANSPORT else {}
+        genai.configure(api_key=config.GEMINI_API_KEY, **options)
+        self.client = genai.GenerativeModel(self.model)
+        self.schedule_config = {
+            'temperature': config.AI_SCHEDULE_TEMPERATURE,
+            'max_output_tokens': config.AI_SCHEDULE_MAX_TOKENS,
+        }
+        if config.AI_JSON_MODE and GEMINI_JSON_MODE_AVAILABLE:
+            self.schedule_config['response_mime_type'] = 'application/json'
+    
+    def _chat_contents(self, message, history, summary):
+        """One stateless request: instructions once up front, then history and the message.
+        
+        The 0.3 SDK has no system_instruction, so the system prompt goes in a
+        leading user/model exchange instead of being repeated in each turn.
+        """
+        contents = [
+            {"role": "user", "parts": [chat_system_prompt(summary)]},
+            {"role": "model", "parts": ["Understood."]},
+        ]
+        for h in history[:-1]:
+            role = "user" if h['role'] == 'user' else "model"
+            contents.append({"role": role, "parts": [h['content']]})
+        contents.append({"role": "user", "parts": [message]})
+        return contents
+    
+    def chat(self, message, history, summary=''):
+        return self.client.generate_content(self._chat_contents(message, history, summary)).text
+    
+    def stream_chat(self, message, history, summary=''):
+        for chunk in self.client.generate_content(self._chat_contents(message, history, summary), stream=True):
+            if chunk.text:
+                yield chunk.text
+    
+    def generate_schedule(self, workflow):
+        response = self.client.generate_content(SCHEDULE_PROMPT.format(workflow=workflow),
+                                                generation_config=self.schedule_config)
+        return parse_schedule_json(response.text)
+    
+    async def achat(self, message, history, summary=''):
+        response = await self.client.generate_content_async(self._chat_contents(message, history, summary))
+        return response.text
+
+class GroqProvider(AIProvider):
+    name = 'groq'
+    label = 'Groq (FREE)'
+    
+    def __init__(self, config, model=None):
+        super().__init__(config, model)
+        self.schedule_options = {
+            'temperature': config.AI_SCHEDULE_TEMPERATURE,
+            'max_tokens': config.AI_SCHEDULE_MAX_TOKENS,
+        }
+        if config.AI_JSON_MODE:
+            self.schedule_options['response_format'] = {"type": "json_object"}
+        options = {'api_key': config.GROQ_API_KEY, 'max_retries': config.AI_MAX_RETRIES}
+        if httpx is None:
+            self.client = Groq(**options)
+            self.async_client = AsyncGroq(**options)
+            return
+        
+        http2 = config.AI_HTTP2 and HTTP2_AVAILABLE
+        if config.AI_HTTP2 and not HTTP2_AVAILABLE:
+            logger.info("/ AI: HTTP/2 disabled (pip install h2 to enable)")
+        transport = dict(
+            limits=httpx.Limits(
+                max_connections=config.AI_HTTP_POOL_SIZE,
+                max_keepalive_connections=config.AI_HTTP_KEEPALIVE,
+                keepalive_expiry=config.AI_HTTP_KEEPALIVE_EXPIRY
+            ),
+            timeout=httpx.Timeout(config.AI_READ_TIMEOUT, connect=config.AI_CONNECT_TIMEOUT),
+            http2=http2
+        )
+        self.client = Groq(http_client=httpx.Client(**transport), timeout=transport['timeout'], **options)
+        self.async_client = AsyncGroq(http_client=httpx.AsyncClient(**transport),
+                                      timeout=transport['timeout'], **options)
+    
+    def _observe_usage(self, op, response, elapsed):
+        """Split wall time into Groq-reported generation time and the network/queue remainder"""
+        usage = getattr(response, 'usage', None)
+        generation = getattr(usage, 'total_time', None)
+        if generation:
+            self.observe(f'{op}.generation', generation)
+            self.observe(f'{op}.network', max(0.0, elapsed - generation))
+    
+    def _chat_request(self, message, history, summary):
+        messages = [{"role": "system", "content": chat_system_prompt(summary)}]
+        for h in history[:-1]:
+            messages.append({"role": h['role'], "content": h['content']})
+        messages.append({"role": "user", "content": message})
+        return dict(model=self.model, messages=messages, temperature=0.7, max_tokens=500)
+    
+    def _schedule_request(self, workflow):
+        return dict(
+            model=self.model,
+            messages=[{"role": "user", "content": SCHEDULE_PROMPT.format(workflow=workflow)}],
+            **self.schedule_options
+        )
+    
+    def chat(self, message, history, summary=''):
+        start = time.perf_counter()
+        response = self.client.chat.completions.create(**self._chat_request(message, history, summary))
+        self._observe_usage('chat', response, time.perf_counter() - start)
+        return response.choices[0].message.content
+    
+    def stream_chat(self, message, history, summary=''):
+        stream = self.client.chat.completions.create(**self._chat_request(message, history, summary), stream=True)
+        for chunk in stream:
+            text = chunk.choices[0].delta.content
+            if text:
+                yield text
+    
+    def generate_schedule(self, workflow):
+        start = time.perf_counter()
+        response = self.client.chat.completions.create(**self._schedule_request(workflow))
+        self._observe_usage('schedule', response, time.perf_counter() - start)
+        return parse_schedule_json(response.choices[0].message.content)
+    
+    async def achat(self, message, history, summary=''):
+        start = time.perf_counter()
+        response = await self.async_client.chat.completions.create(**self._chat_request(message, history, summary))
+        self._observe_usage('chat', response, time.perf_counter() - start)
+        return response.choices[0].message.content
+
+class StubProvider(AIProvider):
+    """Deterministic offline provider for development, benchmarks and load tests.
+    
+    Replies echo the message, schedules come from fallback_schedule(), and
+    every call waits STUB_AI_LATENCY seconds to stand in for generation time.
+    """
+    
+    name = 'stub'
+    label = 'Local stub (offline)'
+    
+    def __init__(self, config, model=None):
+        super().__init__(config, model)
+        self.latency = config.STUB_AI_LATENCY
+    
+    def _reply(self, message, history):
+        return f"[stub] You said: {message[:200]} ({len(history)} messages in context)"
+    
+    def chat(self, message, history, summary=''):
+        time.sleep(self.latency)
+        return self._reply(message, history)
+    
+    def stream_chat(self, message, history, summary=''):
+        words = self._reply(message, history).split(' ')
+        for i, word in enumerate(words):
+            time.sleep(self.latency / len(words))
+            yield word if i == 0 else ' ' + word
+    
+    def generate_schedule(self, workflow):
+        time.sleep(self.latency)
+        return fallback_schedule(workflow)
+    
+    async def achat(self, message, history, summary=''):
+        await asyncio.sleep(self.latency)
+        return self._reply(message, history)
+
+class ProviderRouter(AIProvider):
+    """Routes AI calls across several providers, in priority order.
+    
+    A call goes to the first provider whose breaker allows it. If that one
+    fails, the next is tried (failover). If it is merely slow, a hedge
+    request goes to the next provider after hedge_after seconds and the
+    first good answer wins. A sync loser cannot be cancelled, so it finishes
+    in the background and its result is dropped. Streams fail over only
+    before the first chunk has been sent. The router's own breaker (applied
+    by the AI FUNCTIONS wrappers) only trips when every provider fails.
+    """
+    
+    name = 'router'
+    
+    def __init__(self, config, providers):
+        super().__init__(config)
+        self.providers = providers
+        self.hedge_after = config.AI_HEDGE_AFTER
+        self.label = 'Router (' + ' -> '.join(p.label for p in providers) + ')'
+        self.model = providers[0].model
+        self.semaphore = asyncio.Semaphore(sum(config.AI_MAX_CONCURRENCY.get(p.name, 256) for p in providers))
+        self._executor = ThreadPoolExecutor(max_workers=config.AI_ROUTER_WORKERS, thread_name_prefix='focusflow-ai')
+        self._stats_lock = threading.Lock()
+        self.stats = {'hedges': 0, 'hedge_wins': 0, 'failovers': 0, 'unavailable': 0}
+    
+    def _count(self, key):
+        with self._stats_lock:
+            self.stats[key] += 1
+    
+    def _candidates(self):
+        candidates = [p for p in self.providers if p.breaker.available()]
+        if not candidates:
+            self._count('unavailable')
+            raise RuntimeError('no AI provider available')
+        return candidates
+    
+    def _attempt(self, op, provider, call):
+        if not provider.breaker.allow():
+            raise RuntimeError(f'{provider.name} circuit open')
+        start = time.perf_counter()
+        try:
+            result = call(provider)
+        except Exception as e:
+            provider.breaker.record_failure()
+            logger.error(f"{provider.name} {op} error: {e}")
+            raise
+        finally:
+            provider.observe(f'{op}.total', time.perf_counter() - start)
+        provider.breaker.record_success()
+        return result
+    
+    def _run(self, op, call):
+        queue = self._candidates()
+        pending = {}
+        error = None
+        
+        def launch():
+            provider = queue.pop(0)
+            pending[self._executor.submit(self._attempt, op, provider, call)] = provider
+        
+        launch()
+        hedged = False
+        while pending:
+            hedge = queue and not hedged and self.hedge_after > 0
+            done, _ = wait(pending, timeout=self.hedge_after if hedge else None, return_when=FIRST_COMPLETED)
+            if not done:
+                hedged = True
+                self._count('hedges')
+                launch()
+                continue
+            
+            for future in done:
+                provider = pending.pop(future)
+                try:
+                    result = future.result()
+                except Exception as e:
+                    error = e
+                    continue
+                if provider is not self.providers[0] and hedged:
+                    self._count('hedge_wins')
+                return result
+            
+            if not pending and queue:
+                self._count('failovers')
+                launch()
+        raise error
+    
+    async def _arun(self, op, call):
+        queue = self._candidates()
+        pending = {}
+        error = None
+        
+        async def attempt(provider):
+            if not provider.breaker.allow():
+                raise RuntimeError(f'{provider.name} circuit open')
+            async with provider.semaphore:
+                start = time.perf_counter()
+                try:
+                    result = await call(provider)
+                except asyncio.CancelledError:
+                    provider.breaker.release()
+                    raise
+                except Exception as e:
+                    provider.breaker.record_failure()
+                    logger.error(f"{provider.name} {op} error: {e}")
+                    raise
+                finally:
+                    provider.observe(f'{op}.total', time.perf_counter() - start)
+            provider.breaker.record_success()
+            return result
+        
+        def launch():
+            provider = queue.pop(0)
+            pending[asyncio.ensure_future(attempt(provider))] = provider
+        
+        launch()
+        hedged = False
+        try:
+            while pending:
+                hedge = queue and not hedged and self.hedge_after > 0
+                done, _ = await asyncio.wait(pending, timeout=self.hedge_after if hedge else None,
+                                             return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    hedged = True
+                    self._count('hedges')
+                    launch()
+                    continue
+                
+                for task in done:
+                    provider = pending.pop(task)
+                    if task.exception() is not None:
+                        error = task.exception()
+                        continue
+                    if provider is not self.providers[0] and hedged:
+                        self._count('hedge_wins')
+                    return task.result()
+                
+                if not pending and queue:
+                    self._count('failovers')
+                    launch()
+            raise error
+        finally:
+            for task in pending:
+                task.cancel()
+    
+    def chat(self, message, history, summary=''):
+        return self._run('chat', lambda p: p.chat(message, history, summary))
+    
+    def stream_chat(self, message, history, summary=''):
+        error = None
+        for i, provider in enumerate(self._candidates()):
+            if i:
+                self._count('failovers')
+            if not provider.breaker.allow():
+                continue
+            started = False
+            try:
+                for text in provider.stream_chat(message, history, summary):
+                    started = True
+                    yield text
+            except GeneratorExit:
+                provider.breaker.release()
+                raise
+            except Exception as e:
+                provider.breaker.record_failure()
+                logger.error(f"{provider.name} stream error: {e}")
+                if started:
+                    raise
+                error = e
+                continue
+            provider.breaker.record_success()
+            return
+        raise error or RuntimeError('no AI provider available')
+    
+    def generate_schedule(self, workflow):
+        return self._run('schedule', lambda p: p.generate_schedule(workflow))
+    
+    async def achat(self, message, history, summary=''):
+        return await self._arun('chat', lambda p: p.achat(message, history, summary))
+    
+    def latency_stats(self):
+        stats = {'overall': super().latency_stats()}
+        for provider in self.providers:
+            stats[provider.name] = provider.latency_stats()
+        return stats
+    
+    def status(self):
+        with self._stats_lock:
+            stats = dict(self.stats)
+        return {
+            'hedge_after': self.hedge_after,
+            **stats,
+            'providers': {p.name: p.status() for p in self.providers}
+        }
+
+PROVIDERS = {
+    'gemini': GeminiProvider,
+    'groq': GroqProvider,
+    'stub': StubProvider,
+}
+
+def create_provider(config):
+    """Instantiate the configured provider(s), or None (fallback mode) if none can be set up.
+    
+    With more than one provider configured, they are wrapped in a ProviderRouter.
+    """
+    providers = []
+    for name in config.AI_PROVIDERS:
+        try:
+            model = config.AI_MODEL if name == config.AI_PROVIDER else None
+            provider = PROVIDERS[name](config, model)
+        except KeyError:
+            logger.error(f"Unknown AI provider '{name}'; expected one of {', '.join(PROVIDERS)}")
+            continue
+        except Exception as e:
+            logger.error(f"{name} setup failed: {e}")
+            continue
+        providers.append(provider)
+    
+    if not providers:
+        return None
+    provider = providers[0] if len(providers) == 1 else ProviderRouter(config, providers)
+    logger.info(f"/ AI: {provider.label}")
+    return provider
+
+ai_provider = create_provider(config)
+config.AI_ENABLED = ai_provider is not None
+
+if not config.AI_ENABLED:
+    logger.info("/ AI: Fallback mode (no API needed)")
+
+# ================================
+# AI FUNCTIONS
+# ================================
+
+def normalize_workflow(workflow):
+    """Case- and whitespace-insensitive form of a workflow, used for dedup keys"""
+    return re.sub(r'\s+', ' ', workflow.lower()).strip()
+
+class ScheduleCache:
+    """Content-addressed cache of AI schedules, stored in SQLite.
+    
+    Keys hash the normalized workflow together with the provider, model and
+    prompt version, so a provider or prompt change never serves stale output.
+    Entries expire after ttl seconds; past max_entries the least recently
+    used are dropped.
+    """
+    
+    def __init__(self, ttl, max_entries):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+    
+    def key(self, workflow):
+        raw = '\x1f'.join([normalize_workflow(workflow), config.AI_PROVIDER or '',
+                           config.AI_MODEL or '', str(SCHEDULE_PROMPT_VERSION)])
+        return hashlib.sha256(raw.encode()).hexdigest()
+    
+    def get(self, workflow):
+        key = self.key(workflow)
+        now = time.time()
+        with get_db() as db:
+            row = db.execute('SELECT schedule_json, created_at FROM schedule_cache WHERE cache_key = ?',
+                             (key,)).fetchone()
+            if row and now - row['created_at'] <= self.ttl:
+                db.execute('UPDATE schedule_cache SET last_used = ?, hits = hits + 1 WHERE cache_key = ?',
+                           (now, key))
+                result = json.loads(row['schedule_json'])
+            else:
+                result = None
+        
+        with self._lock:
+            if result is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return result
+    
+    def put(self, workflow, schedule_data):
+        now = time.time()
+        with get_db() as db:
+            db.execute('''INSERT OR REPLACE INTO schedule_cache
+                (cache_key, schedule_json, created_at, last_used) VALUES (?, ?, ?, ?)''',
+                (self.key(workflow), json.dumps(schedule_data), now, now))
+            db.execute('DELETE FROM schedule_cache WHERE created_at < ?', (now - self.ttl,))
+            db.execute('''DELETE FROM schedule_cache WHERE cache_key IN (
+                SELECT cache_key FROM schedule_cache ORDER BY last_used DESC LIMIT -1 OFFSET ?)''',
+                (self.max_entries,))
+    
+    def stats(self):
+        with get_db() as db:
+            size = db.execute('SELECT COUNT(*) FROM schedule_cache').fetchone()[0]
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'size': size,
+                'max_entries': self.max_entries,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_ratio': round(self.hits / lookups, 4) if lookups else 0.0
+            }
+
+schedule_cache = ScheduleCache(config.SCHEDULE_CACHE_TTL, config.SCHEDULE_CACHE_MAX_ENTRIES)
 
-def get_ai_chat_response(message, history):
-    """Get AI chat response"""
-    if config.AI_PROVIDER == 'gemini':
+class SingleFlight:
+    """Coalesces concurrent calls that share a key into one execution.
+    
+    The first caller for a key runs fn; callers arriving while it is in
+    flight wait for its result (or exception) instead of repeating the
+    work. Nothing is kept once the call returns.
+    """
+    
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+        self.executed = 0
+        self.shared = 0
+    
+    def do(self, key, fn):
+        with self._lock:
+            future = self._calls.get(key)
+            leader = future is None
+            if leader:
+                future = self._calls[key] = Future()
+                self.executed += 1
+            else:
+                self.shared += 1
+        if not leader:
+            return future.result()
+        
         try:
-            chat_history = []
-            for h in history[:-1]:
-                role = "user" if h['role'] == 'user' else "model"
-                chat_history.append({"role": role, "parts": [h['content']]})
-            
-            chat = ai_client.start_chat(history=chat_history)
-            
-            prompt = f"""You are FocusFlow AI, a study scheduling assistant for students.
+            result = fn()
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            with self._lock:
+                del self._calls[key]
+    
+    def stats(self):
+        with self._lock:
+            return {'executed': self.executed, 'shared': self.shared, 'in_flight': len(self._calls)}
 
-Help students:
-- Optimize study schedules
-- Provide actionable time management advice
-- Suggest effective study techniques
-- Be encouraging and supportive
+schedule_flights = SingleFlight()
 
-Keep responses brief (2-3 sentences) unless detail is requested.
+def cached_ai_schedule(workflow):
+    """AI schedule from the cache or the provider; concurrent identical workflows share one call"""
+    def generate():
+        schedule_data = schedule_cache.get(workflow)
+        if not schedule_data:
+            schedule_data = get_ai_schedule(workflow)
+            if schedule_data:
+                schedule_cache.put(workflow, schedule_data)
+        return schedule_data
+    return schedule_flights.do(schedule_cache.key(workflow), generate)
 
-Student: {message}"""
-            
-            response = chat.send_message(prompt)
-            return response.text
-            
-        except Exception as e:
-            logger.error(f"Gemini error: {e}")
-            return None
+ai_executor = ThreadPoolExecutor(max_workers=config.AI_WORKERS, thread_name_prefix='focusflow-ai-call')
+
+def _guarded_call(op, fn, deadline):
+    """Run fn() under the provider's circuit breaker and a deadline.
     
-    elif config.AI_PROVIDER == 'groq':
-        try:
-            messages = [
-                {"role": "system", "content": "You are FocusFlow AI, a helpful study scheduling assistant. Provide concise, actionable advice."}
-            ]
-            
-            for h in history[:-1]:
-                messages.append({"role": h['role'], "content": h['content']})
-            
-            messages.append({"role": "user", "content": message})
-            
-            response = ai_client.chat.completions.create(
-                model=config.AI_MODEL,
-                messages=messages,
-                temperature=0.7,
-                max_tokens=500
-            )
-            
-            return response.choices[0].message.content
-            
-        except Exception as e:
-            logger.error(f"Groq error: {e}")
-            return None
+    Returns None right away while the breaker is open, and on error or
+    timeout, so the caller serves its fallback. A timed-out call can't be
+    interrupted; it finishes on its worker thread and is ignored.
+    """
+    breaker = ai_provider.breaker
+    if not breaker.allow():
+        return None
+    start = time.perf_counter()
+    try:
+        result = ai_executor.submit(fn).result(timeout=deadline)
+    except FutureTimeout:
+        breaker.record_failure(timeout=True)
+        logger.error(f"{ai_provider.name} {op} timed out after {deadline}s")
+        return None
+    except Exception as e:
+        breaker.record_failure()
+        logger.error(f"{ai_provider.name} {op} error: {e}")
+        return None
+    finally:
+        ai_provider.observe(f'{op}.total', time.perf_counter() - start)
+    breaker.record_success()
+    return result
+
+async def _aguarded_call(op, make_coro, deadline):
+    """Async _guarded_call; the deadline includes waiting for the provider semaphore"""
+    breaker = ai_provider.breaker
+    if not breaker.allow():
+        return None
     
-    return None
+    async def call():
+        async with ai_provider.semaphore:
+            return await make_coro()
+    
+    start = time.perf_counter()
+    try:
+        result = await asyncio.wait_for(call(), deadline)
+    except asyncio.TimeoutError:
+        breaker.record_failure(timeout=True)
+        logger.error(f"{ai_provider.name} {op} timed out after {deadline}s")
+        return None
+    except asyncio.CancelledError:
+        breaker.release()
+        raise
+    except Exception as e:
+        breaker.record_failure()
+        logger.error(f"{ai_provider.name} {op} error: {e}")
+        return None
+    finally:
+        ai_provider.observe(f'{op}.total', time.perf_counter() - start)
+    breaker.record_success()
+    return result
+
+def get_ai_chat_response(message, history, summary=''):
+    """Get AI chat response"""
+    return _guarded_call('chat', lambda: ai_provider.chat(message, history, summary), config.AI_CHAT_DEADLINE)
 
 def get_ai_schedule(workflow):
     """Get AI schedule generation"""
-    prompt = f"""Generate a study schedule. Return ONLY valid JSON:
+    return _guarded_call('schedule', lambda: ai_provider.generate_schedule(workflow), config.AI_SCHEDULE_DEADLINE)
 
-{{
-  "subjects": [{{"name": "Subject", "priority": "high/medium/low", "hours_per_week": 6}}],
-  "study_blocks": [{{"day": 0-6, "start_time": "9:00 AM", "end_time": "11:00 AM", "subject": "Subject", "topic": "Topic", "priority": "high"}}],
-  "recommendations": ["tip1", "tip2", "tip3"]
-}}
+async def get_ai_chat_response_async(message, history, summary=''):
+    """Awaitable get_ai_chat_response, bounded per provider (ASGI mode)"""
+    return await _aguarded_call('chat', lambda: ai_provider.achat(message, history, summary),
+                                config.AI_CHAT_DEADLINE)
 
-User workflow:
-{workflow}"""
+_STREAM_END = object()
+
+def stream_ai_chat_response(message, history, summary=''):
+    """Yield AI chat response text chunks as the provider produces them.
     
-    if config.AI_PROVIDER == 'gemini':
-        try:
-            response = ai_client.generate_content(prompt)
-            text = response.text
-            
-            if '```json' in text:
-                text = text.split('```json')[1].split('```')[0]
-            elif '```' in text:
-                text = text.split('```')[1].split('```')[0]
-            
-            return json.loads(text.strip())
-        except Exception as e:
-            logger.error(f"Gemini schedule error: {e}")
-            return None
+    The provider stream runs on a worker thread so each chunk, including
+    the first, can be awaited with AI_CHAT_DEADLINE. Errors and timeouts
+    are logged and end the stream; the caller decides whether what was
+    received so far is usable. Time to first chunk is recorded separately
+    from the total, approximating network vs generation time.
+    """
+    breaker = ai_provider.breaker
+    if not breaker.allow():
+        return
     
-    elif config.AI_PROVIDER == 'groq':
+    chunks = Queue()
+    
+    def produce():
         try:
-            response = ai_client.chat.completions.create(
-                model=config.AI_MODEL,
-                messages=[
-                    {"role": "system", "content": "Generate study schedule. Return ONLY valid JSON."},
-                    {"role": "user", "content": prompt}
-                ],
-                temperature=0.5,
-                max_tokens=2000
-            )
-            
-            text = response.choices[0].message.content
-            if '```json' in text:
-                text = text.split('```json')[1].split('```')[0]
-            
-            return json.loads(text.strip())
+            for text in ai_provider.stream_chat(message, history, summary):
+                chunks.put(text)
+            chunks.put(_STREAM_END)
         except Exception as e:
-            logger.error(f"Groq schedule error: {e}")
-            return None
+            chunks.put(e)
     
-    return None
+    ai_executor.submit(produce)
+    start = time.perf_counter()
+    first = True
+    outcome = None
+    try:
+        while True:
+            try:
+                item = chunks.get(timeout=config.AI_CHAT_DEADLINE)
+            except Empty:
+                outcome = 'timeout'
+                logger.error(f"{ai_provider.name} stream stalled for {config.AI_CHAT_DEADLINE}s")
+                return
+            if item is _STREAM_END:
+                outcome = 'success'
+                return
+            if isinstance(item, Exception):
+                outcome = 'error'
+                logger.error(f"{ai_provider.name} stream error: {item}")
+                return
+            if first:
+                ai_provider.observe('stream.first_chunk', time.perf_counter() - start)
+                first = False
+            yield item
+    finally:
+        ai_provider.observe('stream.total', time.perf_counter() - start)
+        if outcome == 'success':
+            breaker.record_success()
+        elif outcome is not None:
+            breaker.record_failure(timeout=outcome == 'timeout')
+        else:
+            breaker.release()
 
 def fallback_schedule(workflow):
     """Rule-based schedule"""
@@ -360,13 +1994,298 @@ def fallback_schedule(workflow):
 # ROUTES
 # ================================
 
+class StaticAssets:
+    """The frontend files, held in memory with fingerprints and compressed variants.
+    
+    Each asset is read once and served from memory under two URLs: its own
+    name (revalidated on every use) and a content-fingerprinted name such
+    as script.3f2a9c1b7d4e.js (cached for max_age, immutable). index.html
+    is rewritten to reference the fingerprinted names. gzip and brotli
+    variants are built at load time, or taken from name.gz / name.br files
+    on disk when those are at least as new as the source. In debug mode
+    the files are reloaded when they change.
+    """
+    
+    ENCODINGS = (('br', '.br'), ('gzip', '.gz'))
+    
+    def __init__(self, root, names, max_age, index='index.html'):
+        self.root = root
+        self.names = names
+        self.max_age = max_age
+        self.index = index
+        self.assets = {}
+        self.mtimes = {}
+        self._lock = threading.Lock()
+        self.load()
+    
+    def load(self):
+        assets = {}
+        mtimes = {}
+        urls = {}
+        for name in self.names:
+            path = os.path.join(self.root, name)
+            if not os.path.isfile(path):
+                logger.warning(f"Static file {name} not found; it will not be served")
+                continue
+            mtimes[name] = os.path.getmtime(path)
+            if name == self.index:
+                continue
+            with open(path, 'rb') as f:
+                asset = self._build(name, f.read(), mtimes[name], from_disk=True)
+            assets[name] = asset
+            assets[asset['fingerprinted']] = dict(asset, immutable=True)
+            urls[name] = asset['fingerprinted']
+        
+        if self.index in mtimes:
+            with open(os.path.join(self.root, self.index), encoding='utf-8') as f:
+                html = f.read()
+            for name, url in urls.items():
+                html = re.sub(r'((?:href|src)=["\'])' + re.escape(name) + r'(["\'])', rf'\g<1>{url}\g<2>', html)
+            assets[self.index] = self._build(self.index, html.encode(), mtimes[self.index], from_disk=False)
+        
+        with self._lock:
+            self.assets = assets
+            self.mtimes = mtimes
+    
+    def _build(self, name, data, mtime, from_disk):
+        digest = hashlib.sha256(data).hexdigest()[:12]
+        stem, ext = os.path.splitext(name)
+        variants = {None: data}
+        for encoding, suffix in self.ENCODINGS:
+            path = os.path.join(self.root, name + suffix)
+            if from_disk and os.path.isfile(path) and os.path.getmtime(path) >= mtime:
+                with open(path, 'rb') as f:
+                    variants[encoding] = f.read()
+            elif encoding == 'gzip':
+                variants[encoding] = gzip.compress(data, compresslevel=9, mtime=0)
+            elif BROTLI_AVAILABLE:
+                variants[encoding] = brotli.compress(data, quality=11)
+        return {
+            'fingerprinted': f'{stem}.{digest}{ext}',
+            'digest': digest,
+            'mimetype': mimetypes.guess_type(name)[0] or 'application/octet-stream',
+            'mtime': int(mtime),
+            'immutable': False,
+            'variants': {k: v for k, v in variants.items() if k is None or len(v) < len(data)},
+        }
+    
+    def reload_if_changed(self):
+        for name, mtime in list(self.mtimes.items()):
+            try:
+                changed = os.path.getmtime(os.path.join(self.root, name)) != mtime
+            except OSError:
+                changed = True
+            if changed:
+                self.load()
+                return
+    
+    def response(self, path):
+        """Response for path, honouring Accept-Encoding and If-None-Match; None if not an asset"""
+        if app.debug:
+            self.reload_if_changed()
+        asset = self.assets.get(path)
+        if asset is None:
+            return None
+        
+        variants = asset['variants']
+        encoding = next((e for e, _ in self.ENCODINGS if e in variants and request.accept_encodings[e]), None)
+        response = Response(variants[encoding], mimetype=asset['mimetype'])
+        if encoding:
+            response.headers['Content-Encoding'] = encoding
+        response.vary.add('Accept-Encoding')
+        response.set_etag(asset['digest'] + (f'-{encoding}' if encoding else ''))
+        response.last_modified = asset['mtime']
+        if asset['immutable']:
+            response.headers['Cache-Control'] = f'public, max-age={self.max_age}, immutable'
+        else:
+            response.headers['Cache-Control'] = 'no-cache'
+        return response.make_conditional(request)
+
+static_assets = StaticAssets(app.root_path, config.STATIC_FILES, config.STATIC_MAX_AGE)
+
 @app.route('/')
 def serve_index():
-    return send_from_directory('.', 'index.html')
+    return serve_static(static_assets.index)
 
 @app.route('/<path:path>')
 def serve_static(path):
-    return send_from_directory('.', path)
+    response = static_assets.response(path)
+    if response is None:
+        abort(404)
+    return response
+
+CHAT_FALLBACKS = [
+    "Focus on high-priority subjects during peak concentration hours. Would you like help creating a schedule?",
+    "Try the Pomodoro Technique: 25 minutes of focused work followed by a 5-minute break.",
+    "Create a balanced schedule alternating between subjects to prevent burnout.",
+    "Active recall and spaced repetition are proven effective. Would you like help incorporating these?",
+]
+
+def fallback_chat_response(history):
+    return CHAT_FALLBACKS[len(history) % len(CHAT_FALLBACKS)]
+
+def estimate_tokens(text):
+    """Rough token count (~4 characters per token); no tokenizer dependency"""
+    return len(text) // 4 + 1
+
+def compact_message(message, max_chars=160):
+    """One-line digest of a chat message for the rolling summary"""
+    text = re.sub(r'\s+', ' ', message['content']).strip()
+    first_sentence = re.split(r'(?<=[.!?])\s', text, maxsplit=1)[0]
+    if len(first_sentence) > max_chars:
+        first_sentence = first_sentence[:max_chars - 3].rstrip() + '...'
+    who = 'Student' if message['role'] == 'user' else 'FocusFlow'
+    return f"- {who}: {first_sentence}"
+
+def merge_summary(summary, messages, max_chars):
+    """Append digests of messages to summary, dropping the oldest lines past max_chars"""
+    lines = (summary.splitlines() if summary else []) + [compact_message(m) for m in messages]
+    while lines and len('\n'.join(lines)) > max_chars:
+        lines.pop(0)
+    return '\n'.join(lines)
+
+def fit_summary(summary, max_tokens):
+    """Drop the oldest summary lines until the system prompt carrying it costs at most max_tokens"""
+    lines = summary.splitlines() if summary else []
+    while lines and estimate_tokens(chat_system_prompt('\n'.join(lines))) > max_tokens:
+        lines.pop(0)
+    return '\n'.join(lines)
+
+class ChatSummaryStore:
+    """Rolling per-user summary of messages that left the recent-history buffer.
+    
+    Summaries are cached in an LRU, loaded from chat_summaries on a miss,
+    and written back in the same transaction as the next chat turn.
+    """
+    
+    def __init__(self, max_users, max_chars):
+        self.max_chars = max_chars
+        self._summaries = LRUCache(max_users)
+        self._dirty = set()
+        self._lock = threading.Lock()
+    
+    def get(self, user_id):
+        summary = self._summaries.get(user_id)
+        if summary is None:
+            with get_db() as db:
+                row = db.execute('SELECT summary FROM chat_summaries WHERE user_id = ?', (user_id,)).fetchone()
+            summary = row['summary'] if row else ''
+            self._summaries.put(user_id, summary)
+        return summary
+    
+    def fold(self, user_id, messages):
+        summary = merge_summary(self.get(user_id), messages, self.max_chars)
+        self._summaries.put(user_id, summary)
+        with self._lock:
+            self._dirty.add(user_id)
+    
+    def flush(self, db, user_id):
+        with self._lock:
+            if user_id not in self._dirty:
+                return
+            self._dirty.discard(user_id)
+        db.execute('''INSERT INTO chat_summaries (user_id, summary) VALUES (?, ?)
+            ON CONFLICT(user_id) DO UPDATE SET summary = excluded.summary, updated_at = CURRENT_TIMESTAMP''',
+            (user_id, self.get(user_id)))
+
+chat_summaries = ChatSummaryStore(config.CHAT_BUFFER_USERS, config.AI_SUMMARY_MAX_CHARS)
+
+class ChatHistoryBuffer:
+    """Per-user ring buffer of the most recent chat messages.
+    
+    A user's buffer is loaded from chat_history on first access and then
+    kept current by the chat routes, so a warm chat turn reads nothing from
+    the database. Messages pushed out of a full buffer are folded into the
+    user's rolling summary. Buffers live in an LRU bounded by max_users.
+    They are process-local: with several worker processes each keeps its
+    own view.
+    """
+    
+    def __init__(self, max_users, size):
+        self.size = size
+        self._buffers = LRUCache(max_users)
+    
+    def recent(self, user_id):
+        buffer = self._buffers.get(user_id)
+        if buffer is None:
+            with get_db() as db:
+                rows = db.execute('SELECT role, content FROM chat_history WHERE user_id = ? ORDER BY id DESC LIMIT ?',
+                                  (user_id, self.size)).fetchall()
+            buffer = deque(({'role': r['role'], 'content': r['content']} for r in reversed(rows)),
+                           maxlen=self.size)
+            self._buffers.put(user_id, buffer)
+        return buffer
+    
+    def append(self, user_id, role, content):
+        buffer = self.recent(user_id)
+        if len(buffer) == buffer.maxlen:
+            chat_summaries.fold(user_id, [buffer[0]])
+        buffer.append({'role': role, 'content': content})
+        return buffer
+    
+    def stats(self):
+        return self._buffers.stats()
+
+chat_buffer = ChatHistoryBuffer(config.CHAT_BUFFER_USERS, config.CHAT_CONTEXT_MESSAGES)
+
+# Estimated prompt size per chat request
+prompt_metrics = Counters('requests', 'total_tokens', 'max_tokens', 'trimmed_messages', 'with_summary',
+                          mean_tokens=('total_tokens', 'requests', 1))
+
+def build_chat_context(user_id, buffer):
+    """Fit recent history into the token budget; returns (history, summary).
+    
+    The system prompt with the stored summary is reserved first, then the
+    newest messages are kept verbatim, newest first, until AI_CONTEXT_TOKENS
+    is spent. Anything older in the buffer is compacted into the summary
+    for this request only (it joins the stored summary once it leaves the
+    buffer), and the summary is trimmed to whatever budget is left.
+    """
+    messages = list(buffer)
+    current = messages[-1]
+    stored = chat_summaries.get(user_id)
+    prompt_budget = config.AI_CONTEXT_TOKENS - estimate_tokens(current['content'])
+    budget = prompt_budget - estimate_tokens(chat_system_prompt(stored))
+    
+    kept = []
+    for message in reversed(messages[:-1]):
+        cost = estimate_tokens(message['content'])
+        if cost > budget:
+            break
+        budget -= cost
+        kept.append(message)
+    kept.reverse()
+    
+    trimmed = messages[:len(messages) - 1 - len(kept)]
+    summary = stored
+    if trimmed:
+        summary = merge_summary(summary, trimmed, config.AI_SUMMARY_MAX_CHARS)
+    summary = fit_summary(summary, prompt_budget - sum(estimate_tokens(m['content']) for m in kept))
+    
+    history = kept + [current]
+    tokens = estimate_tokens(chat_system_prompt(summary)) + sum(estimate_tokens(m['content']) for m in history)
+    prompt_metrics.add(requests=1, total_tokens=tokens, max_tokens=tokens,
+                       trimmed_messages=len(trimmed), with_summary=int(bool(summary)))
+    return history, summary
+
+def begin_chat_turn(user_id, message):
+    """Add the user's message to the recent-history buffer and return (history, summary) for the AI"""
+    buffer = chat_buffer.append(user_id, 'user', message)
+    return build_chat_context(user_id, buffer)
+
+def finish_chat_turn(user_id, message, reply):
+    """Persist both sides of a chat turn (and any summary change) in a single write; returns the reply's id"""
+    chat_buffer.append(user_id, 'assistant', reply)
+    with get_db() as db:
+        cursor = db.execute('INSERT INTO chat_history (user_id, role, content) VALUES (?, ?, ?), (?, ?, ?)',
+                            (user_id, 'user', message, user_id, 'assistant', reply))
+        message_id = cursor.lastrowid
+        chat_summaries.flush(db, user_id)
+        bump_version(db, user_id, 'chat')
+        return message_id
+
+def sse_event(event, data):
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
 
 @app.route('/api/chat', methods=['POST'])
 @require_user
@@ -376,92 +2295,470 @@ def chat(user_id):
     if not message:
         return jsonify({'error': 'Message required'}), 400
     
-    with get_db() as db:
-        cursor = db.cursor()
-        cursor.execute('INSERT INTO chat_history (user_id, role, content) VALUES (?, ?, ?)',
-                      (user_id, 'user', message))
-        cursor.execute('SELECT role, content FROM chat_history WHERE user_id = ? ORDER BY timestamp DESC LIMIT 10',
-                      (user_id,))
-        history = list(reversed(cursor.fetchall()))
+    history, summary = begin_chat_turn(user_id, message)
     
     ai_response = None
-    if config.AI_ENABLED:
-        ai_response = get_ai_chat_response(message, history)
-    
-    if not ai_response:
-        fallbacks = [
-            "Focus on high-priority subjects during peak concentration hours. Would you like help creating a schedule?",
-            "Try the Pomodoro Technique: 25 minutes of focused work followed by a 5-minute break.",
-            "Create a balanced schedule alternating between subjects to prevent burnout.",
-            "Active recall and spaced repetition are proven effective. Would you like help incorporating these?",
-        ]
-        ai_response = fallbacks[len(history) % len(fallbacks)]
+    try:
+        if config.AI_ENABLED:
+            ai_response = get_ai_chat_response(message, history, summary)
+    finally:
+        # The message is already in the buffer, so always save the turn
+        ai_response = ai_response or fallback_chat_response(history)
+        message_id = finish_chat_turn(user_id, message, ai_response)
     
-    with get_db() as db:
-        cursor = db.cursor()
-        cursor.execute('INSERT INTO chat_history (user_id, role, content) VALUES (?, ?, ?)',
-                      (user_id, 'assistant', ai_response))
+    return jsonify({'response': ai_response, 'id': message_id, 'timestamp': datetime.now().isoformat()})
+
+@app.route('/api/chat/stream', methods=['POST'])
+@require_user
+def chat_stream(user_id):
+    """Server-Sent Events variant of /api/chat.
+    
+    Emits a `token` event per provider chunk and a final `done` event with
+    the full response once it has been saved to chat_history. If the client
+    disconnects mid-stream the turn is still saved with the partial reply.
+    """
+    data = request.get_json()
+    message = sanitize(data.get('message', ''), 2000)
+    if not message:
+        return jsonify({'error': 'Message required'}), 400
+    
+    history, summary = begin_chat_turn(user_id, message)
     
-    return jsonify({'response': ai_response, 'timestamp': datetime.now().isoformat()})
+    def generate():
+        parts = []
+        saved = False
+        try:
+            if config.AI_ENABLED:
+                for text in stream_ai_chat_response(message, history, summary):
+                    parts.append(text)
+                    yield sse_event('token', {'text': text})
+            
+            ai_response = ''.join(parts)
+            if not ai_response:
+                ai_response = fallback_chat_response(history)
+                yield sse_event('token', {'text': ai_response})
+            
+            saved = True
+            message_id = finish_chat_turn(user_id, message, ai_response)
+            yield sse_event('done', {'response': ai_response, 'id': message_id,
+                                     'timestamp': datetime.now().isoformat()})
+        finally:
+            # Client went away (GeneratorExit) or the stream failed
+            if not saved:
+                finish_chat_turn(user_id, message, ''.join(parts) or fallback_chat_response(history))
+    
+    return Response(stream_with_context(generate()), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+def _int_arg(name):
+    value = request.args.get(name)
+    try:
+        return int(value) if value is not None else None
+    except ValueError:
+        return None
 
 @app.route('/api/chat/history', methods=['GET'])
 @require_user
+@conditional('chat')
 def get_chat_history(user_id):
-    limit = min(int(request.args.get('limit', 50)), 200)
+    """Keyset-paginated chat history, oldest first within a page.
+    
+    - no cursor: the latest `limit` messages
+    - before_id: the `limit` messages just older than that id (scroll back)
+    - after_id: messages newer than that id (incremental refresh)
+    
+    `has_more` says whether more messages exist in the direction paged.
+    Pass `next_before_id` back to scroll further, and `latest_id` as
+    after_id to fetch only newer messages next time.
+    """
+    limit = max(1, min(_int_arg('limit') or 50, 200))
+    before_id = _int_arg('before_id')
+    after_id = _int_arg('after_id')
+    
+    with get_db() as db:
+        cursor = db.cursor()
+        if after_id is not None:
+            cursor.execute('''SELECT id, role, content, timestamp FROM chat_history
+                WHERE user_id = ? AND id > ? ORDER BY id LIMIT ?''', (user_id, after_id, limit + 1))
+        elif before_id is not None:
+            cursor.execute('''SELECT id, role, content, timestamp FROM chat_history
+                WHERE user_id = ? AND id < ? ORDER BY id DESC LIMIT ?''', (user_id, before_id, limit + 1))
+        else:
+            cursor.execute('''SELECT id, role, content, timestamp FROM chat_history
+                WHERE user_id = ? ORDER BY id DESC LIMIT ?''', (user_id, limit + 1))
+        rows = cursor.fetchall()
+    
+    has_more = len(rows) > limit
+    history = [dict(row) for row in rows[:limit]]
+    if after_id is None:
+        history.reverse()
+    
+    return jsonify({
+        'history': history,
+        'has_more': has_more,
+        'next_before_id': history[0]['id'] if has_more and after_id is None else None,
+        'latest_id': history[-1]['id'] if history else after_id
+    })
+
+def study_block_row(block):
+    """study_blocks column tuple for a block already run through normalize_study_block"""
+    return tuple(block[column] for column in STUDY_BLOCK_COLUMNS)
+
+def coerce_study_blocks(blocks):
+    """Normalize untrusted (imported) blocks into study_blocks column tuples.
+    
+    Returns (rows, dropped): (day_of_week, start_time, end_time, subject,
+    topic, priority) rows, and the indexes of blocks normalize_study_block
+    rejected.
+    """
+    rows = []
+    dropped = []
+    for i, block in enumerate(blocks):
+        block = normalize_study_block(block)
+        if block:
+            rows.append(study_block_row(block))
+        else:
+            dropped.append(i)
+    return rows, dropped
+
+def _insert_schedules(cursor, user_id, schedules):
+    """Insert (week_start, block_rows) pairs; blocks for all of them go in one executemany"""
+    schedule_ids = []
+    block_batch = []
+    for week_start, rows in schedules:
+        cursor.execute('INSERT INTO schedules (user_id, week_start) VALUES (?, ?)',
+                      (user_id, week_start))
+        schedule_id = cursor.lastrowid
+        schedule_ids.append(schedule_id)
+        block_batch.extend((schedule_id,) + row for row in rows)
+    
+    cursor.executemany('''INSERT INTO study_blocks 
+        (schedule_id, day_of_week, start_time, end_time, subject, topic, priority)
+        VALUES (?, ?, ?, ?, ?, ?, ?)''', block_batch)
+    bump_version(cursor, user_id, 'schedule')
+    return schedule_ids
+
+def current_week_start():
+    today = datetime.now().date()
+    return today - timedelta(days=today.weekday())
+
+def save_schedule(user_id, workflow_id, schedule_data):
+    """Store a generated schedule for the current week and link it to its workflow"""
+    # Blocks were normalized by validate_schedule or built by fallback_schedule
+    rows = [study_block_row(block) for block in schedule_data['study_blocks']]
+    
     with get_db() as db:
         cursor = db.cursor()
-        cursor.execute('SELECT role, content, timestamp FROM chat_history WHERE user_id = ? ORDER BY timestamp DESC LIMIT ?',
-                      (user_id, limit))
-        history = [dict(row) for row in cursor.fetchall()]
-    return jsonify({'history': list(reversed(history))})
+        schedule_id, = _insert_schedules(cursor, user_id, [(current_week_start(), rows)])
+        cursor.execute('UPDATE workflows SET generated_schedule_id = ? WHERE id = ?',
+                      (schedule_id, workflow_id))
+    return schedule_id
+
+def build_schedule(user_id, workflow_id, workflow):
+    """Generate (cache, AI, then rule-based fallback) and save a schedule; returns the response payload"""
+    schedule_data = cached_ai_schedule(workflow) if config.AI_ENABLED else None
+    if not schedule_data:
+        schedule_data = fallback_schedule(workflow)
+    
+    schedule_id = save_schedule(user_id, workflow_id, schedule_data)
+    return {'success': True, 'schedule_id': schedule_id, 'schedule_data': schedule_data}
+
+class ScheduleJobQueue:
+    """SQLite-backed schedule generation jobs run by a fixed pool of worker threads.
+    
+    Jobs left running by a crashed worker are requeued up to max_attempts;
+    resubmitting a workflow still in flight returns the existing job.
+    """
+    
+    def __init__(self, workers, poll_interval, max_attempts, recover_interval):
+        self.workers = workers
+        self.poll_interval = poll_interval
+        self.max_attempts = max_attempts
+        self.recover_interval = recover_interval
+        self._next_run = {}
+        self._futures = {}
+        self._active = {}
+        self._job_keys = {}
+        self._submit_lock = threading.Lock()
+        self._wakeup = threading.Condition()
+        self._pending = 0
+        self._threads = []
+        self._lock = threading.Lock()
+        self.completed = 0
+        self.failed = 0
+        self.recovered = 0
+        self.coalesced = 0
+    
+    def start(self):
+        with self._lock:
+            if self._threads:
+                return
+            self.recover()
+            self._next_run['recover'] = time.monotonic() + self.recover_interval
+            for i in range(self.workers):
+                thread = threading.Thread(target=self._work, name=f'schedule-job-{i}', daemon=True)
+                thread.start()
+                self._threads.append(thread)
+    
+    def recover(self):
+        """Requeue jobs whose worker died mid-run; give up on them after max_attempts"""
+        stale = f"-{int(config.AI_SCHEDULE_DEADLINE * 2)} seconds"
+        with get_db() as db:
+            requeued = db.execute('''UPDATE schedule_jobs SET status = 'queued'
+                WHERE status = 'running' AND attempts < ? AND started_at < datetime('now', ?)''',
+                (self.max_attempts, stale)).rowcount
+            db.execute('''UPDATE schedule_jobs SET status = 'failed', error = 'worker lost',
+                finished_at = CURRENT_TIMESTAMP
+                WHERE status = 'running' AND started_at < datetime('now', ?)''', (stale,))
+        self.recovered += requeued
+        if requeued:
+            logger.info(f"/ Requeued {requeued} interrupted schedule jobs")
+            with self._wakeup:
+                self._pending += requeued
+                self._wakeup.notify_all()
+    
+    def submit(self, user_id, workflow):
+        """Queue a generation job; returns (job_id, future)"""
+        self.start()
+        key = (user_id, normalize_workflow(workflow))
+        with self._submit_lock:
+            job_id = self._active.get(key)
+            future = self._futures.get(job_id)
+            if future is not None:
+                self.coalesced += 1
+                return job_id, future
+            
+            with get_db() as db:
+                cursor = db.cursor()
+                cursor.execute('INSERT INTO workflows (user_id, workflow_text) VALUES (?, ?)', (user_id, workflow))
+                cursor.execute('INSERT INTO schedule_jobs (user_id, workflow_id, workflow_text) VALUES (?, ?, ?)',
+                               (user_id, cursor.lastrowid, workflow))
+                job_id = cursor.lastrowid
+            future = Future()
+            self._futures[job_id] = future
+            self._active[key] = job_id
+            self._job_keys[job_id] = key
+        with self._wakeup:
+            self._pending += 1
+            self._wakeup.notify()
+        return job_id, future
+    
+    def _claim(self):
+        with get_db() as db:
+            return db.execute('''UPDATE schedule_jobs
+                SET status = 'running', attempts = attempts + 1, started_at = CURRENT_TIMESTAMP
+                WHERE id = (SELECT id FROM schedule_jobs WHERE status = 'queued' ORDER BY id LIMIT 1)
+                RETURNING id, user_id, workflow_id, workflow_text''').fetchone()
+    
+    def _due(self, task, interval):
+        """True for the one worker whose turn it is to run a periodic task"""
+        with self._lock:
+            now = time.monotonic()
+            if now < self._next_run.get(task, 0):
+                return False
+            self._next_run[task] = now + interval
+            return True
+    
+    def _work(self):
+        while True:
+            with self._wakeup:
+                if not self._pending:
+                    self._wakeup.wait(self.poll_interval)
+                if self._pending:
+                    self._pending -= 1
+                elif not self._due('poll', self.poll_interval):
+                    continue
+            if self._due('recover', self.recover_interval):
+                try:
+                    self.recover()
+                except sqlite3.Error as e:
+                    logger.error(f"Schedule job recovery error: {e}")
+            while True:
+                try:
+                    job = self._claim()
+                except sqlite3.Error as e:
+                    logger.error(f"Schedule job claim error: {e}")
+                    break
+                if job is None:
+                    break
+                self._run(job)
+    
+    def _run(self, job):
+        try:
+            payload = build_schedule(job['user_id'], job['workflow_id'], job['workflow_text'])
+        except Exception as e:
+            logger.error(f"Schedule job {job['id']} failed: {e}")
+            self._finish(job['id'], 'failed', error=str(e))
+        else:
+            self._finish(job['id'], 'done', payload)
+    
+    def _finish(self, job_id, status, payload=None, error=None):
+        try:
+            with get_db() as db:
+                db.execute('''UPDATE schedule_jobs
+                    SET status = ?, schedule_id = ?, result = ?, error = ?, finished_at = CURRENT_TIMESTAMP
+                    WHERE id = ?''',
+                    (status, payload and payload['schedule_id'], payload and json.dumps(payload), error, job_id))
+        except sqlite3.Error as e:
+            logger.error(f"Schedule job {job_id} status update failed: {e}")
+        with self._lock:
+            if status == 'done':
+                self.completed += 1
+            else:
+                self.failed += 1
+        with self._submit_lock:
+            future = self._futures.pop(job_id, None)
+            self._active.pop(self._job_keys.pop(job_id, None), None)
+        if future is not None:
+            future.set_result(payload)
+    
+    def waiter(self, job_id):
+        """Future for a job submitted by this process, if it is still in flight"""
+        return self._futures.get(job_id)
+    
+    def get(self, job_id, user_id):
+        with get_db() as db:
+            row = db.execute('''SELECT id, status, attempts, schedule_id, result, error,
+                created_at, started_at, finished_at
+                FROM schedule_jobs WHERE id = ? AND user_id = ?''', (job_id, user_id)).fetchone()
+        if row is None:
+            return None
+        job = dict(row)
+        job['job_id'] = job.pop('id')
+        result = job.pop('result')
+        job['schedule_data'] = json.loads(result)['schedule_data'] if result else None
+        return job
+    
+    def stats(self):
+        with self._lock:
+            return {
+                'workers': len(self._threads),
+                'in_flight': len(self._futures),
+                'completed': self.completed,
+                'failed': self.failed,
+                'recovered': self.recovered,
+                'coalesced': self.coalesced
+            }
+
+schedule_jobs = ScheduleJobQueue(config.SCHEDULE_JOB_WORKERS, config.SCHEDULE_JOB_POLL,
+                                 config.SCHEDULE_JOB_MAX_ATTEMPTS, config.SCHEDULE_JOB_RECOVER_INTERVAL)
+
+def job_accepted(job_id):
+    return {'success': True, 'job_id': job_id, 'status': 'queued',
+            'status_url': f'/api/schedule-jobs/{job_id}'}
 
 @app.route('/api/generate-schedule', methods=['POST'])
 @require_user
 def generate_schedule(user_id):
+    """Queue schedule generation.
+    
+    With {"async": true} the response is 202 with a job id to poll at
+    /api/schedule-jobs/<id>. Otherwise the request waits for the job (up
+    to AI_SCHEDULE_DEADLINE plus a margin) and returns the schedule.
+    """
     data = request.get_json()
     workflow = sanitize(data.get('workflow', ''), 5000)
     if not workflow:
         return jsonify({'error': 'Workflow required'}), 400
     
-    with get_db() as db:
-        cursor = db.cursor()
-        cursor.execute('INSERT INTO workflows (user_id, workflow_text) VALUES (?, ?)',
-                      (user_id, workflow))
-        workflow_id = cursor.lastrowid
+    job_id, future = schedule_jobs.submit(user_id, workflow)
+    if data.get('async'):
+        return jsonify(job_accepted(job_id)), 202
     
-    schedule_data = None
-    if config.AI_ENABLED:
-        schedule_data = get_ai_schedule(workflow)
+    try:
+        payload = future.result(timeout=config.AI_SCHEDULE_DEADLINE + 5)
+    except FutureTimeout:
+        return jsonify(job_accepted(job_id)), 202
+    if payload is None:
+        return jsonify({'error': 'Schedule generation failed', 'job_id': job_id}), 500
+    return jsonify(payload)
+
+@app.route('/api/schedule-jobs/<int:job_id>', methods=['GET'])
+@require_user
+def get_schedule_job(user_id, job_id):
+    """Job status; ?wait=N long-polls up to N seconds for a queued or running job to finish.
     
-    if not schedule_data:
-        schedule_data = fallback_schedule(workflow)
+    Jobs submitted by this process are awaited directly; others (another
+    worker process, or a restart) are re-read every half second.
+    """
+    wait = min(max(_int_arg('wait') or 0, 0), config.SCHEDULE_JOB_MAX_WAIT)
+    deadline = time.monotonic() + wait
+    schedule_jobs.start()
+    
+    job = schedule_jobs.get(job_id, user_id)
+    while job and job['status'] in ('queued', 'running') and time.monotonic() < deadline:
+        remaining = deadline - time.monotonic()
+        future = schedule_jobs.waiter(job_id)
+        if future is not None:
+            try:
+                future.result(timeout=remaining)
+            except FutureTimeout:
+                pass
+        else:
+            time.sleep(min(0.5, remaining))
+        job = schedule_jobs.get(job_id, user_id)
+    
+    if job is None:
+        return jsonify({'error': 'Job not found'}), 404
+    return jsonify(job)
+
+@app.route('/api/schedules/import', methods=['POST'])
+@require_user
+def import_schedules(user_id):
+    """Bulk-import schedules: {"schedules": [{"week_start": "YYYY-MM-DD", "study_blocks": [...]}]}
+    
+    All schedules are validated first and written in one transaction;
+    any invalid schedule or study block rejects the whole import, with
+    the offending block indexes listed per schedule in `details`.
+    """
+    data = request.get_json(silent=True) or {}
+    items = data.get('schedules')
+    if not isinstance(items, list) or not items:
+        return jsonify({'error': 'schedules list required'}), 400
+    if len(items) > config.IMPORT_MAX_SCHEDULES:
+        return jsonify({'error': f'At most {config.IMPORT_MAX_SCHEDULES} schedules per import'}), 400
+    
+    schedules = []
+    errors = []
+    for i, item in enumerate(items):
+        if not isinstance(item, dict):
+            errors.append({'index': i, 'error': 'Schedule must be an object'})
+            continue
+        try:
+            week_start = date.fromisoformat(str(item.get('week_start')))
+        except ValueError:
+            errors.append({'index': i, 'error': 'week_start must be YYYY-MM-DD'})
+            continue
+        blocks = item.get('study_blocks', [])
+        if not isinstance(blocks, list):
+            errors.append({'index': i, 'error': 'study_blocks must be a list'})
+            continue
+        rows, dropped = coerce_study_blocks(blocks)
+        if dropped:
+            errors.append({'index': i, 'blocks': dropped,
+                           'error': 'Invalid study blocks: day, start_time, end_time and subject are required'})
+            continue
+        schedules.append((week_start, rows))
     
-    week_start = datetime.now().date() - timedelta(days=datetime.now().weekday())
+    if errors:
+        return jsonify({'error': 'Invalid schedules', 'details': errors}), 400
     
     with get_db() as db:
-        cursor = db.cursor()
-        cursor.execute('INSERT INTO schedules (user_id, week_start) VALUES (?, ?)',
-                      (user_id, week_start))
-        schedule_id = cursor.lastrowid
-        
-        for block in schedule_data.get('study_blocks', []):
-            cursor.execute('''INSERT INTO study_blocks 
-                (schedule_id, day_of_week, start_time, end_time, subject, topic, priority)
-                VALUES (?, ?, ?, ?, ?, ?, ?)''',
-                (schedule_id, block['day'], block['start_time'], block['end_time'],
-                 block['subject'], block.get('topic', ''), block.get('priority', 'medium')))
-        
-        cursor.execute('UPDATE workflows SET generated_schedule_id = ? WHERE id = ?',
-                      (schedule_id, workflow_id))
+        schedule_ids = _insert_schedules(db.cursor(), user_id, schedules)
     
-    return jsonify({'success': True, 'schedule_id': schedule_id, 'schedule_data': schedule_data})
+    return jsonify({
+        'success': True,
+        'schedule_ids': schedule_ids,
+        'blocks_imported': sum(len(rows) for _, rows in schedules)
+    })
 
 @app.route('/api/schedule', methods=['GET'])
 @require_user
+@conditional('schedule', vary=current_week_start)
 def get_schedule(user_id):
     week_start = request.args.get('week_start')
     if not week_start:
-        week_start = datetime.now().date() - timedelta(days=datetime.now().weekday())
+        week_start = current_week_start()
     
     with get_db() as db:
         cursor = db.cursor()
@@ -478,26 +2775,216 @@ def get_schedule(user_id):
     
     return jsonify({'schedule_id': schedule['id'], 'week_start': str(week_start), 'blocks': blocks})
 
+GOAL_PERCENT = '''CASE WHEN descendants > 0 THEN ROUND(100.0 * completed_descendants / descendants, 1)
+                   ELSE completed * 100.0 END AS percent'''
+GOAL_COLUMNS = f'''id, parent_id, title, description, type, priority, completed, created_at, depth,
+                  descendants, completed_descendants, {GOAL_PERCENT}'''
+
+def subtree_range(path):
+    """Bounds of a goal's subtree on the path column: '/1/5/' <= path < '/1/50'.
+    
+    '/' sorts just below '0', so the half-open range covers the goal and
+    every descendant and nothing else, and is served by idx_goals_user_path.
+    """
+    return path, path[:-1] + '0'
+
+def build_goal_tree(rows):
+    """Nest goal rows ordered by depth; rows whose parent is absent become roots"""
+    nodes = {}
+    roots = []
+    for row in rows:
+        node = dict(row, children=[])
+        nodes[node['id']] = node
+        parent = nodes.get(node['parent_id'])
+        if parent is not None:
+            parent['children'].append(node)
+        else:
+            roots.append(node)
+    return roots
+
+def _goal_path(db, user_id, goal_id):
+    return db.execute('SELECT path, depth FROM goals WHERE id = ? AND user_id = ?', (goal_id, user_id)).fetchone()
+
 @app.route('/api/goals', methods=['GET'])
 @require_user
+@conditional('goals')
 def get_goals(user_id):
+    """The user's goal forest; ?depth=N limits it to N levels below the roots"""
+    depth = _int_arg('depth')
     with get_db() as db:
-        cursor = db.cursor()
-        cursor.execute('SELECT * FROM goals WHERE user_id = ? ORDER BY created_at', (user_id,))
-        goals = [dict(row) for row in cursor.fetchall()]
+        if depth is None:
+            rows = db.execute(f'''SELECT {GOAL_COLUMNS} FROM goals WHERE user_id = ?
+                ORDER BY depth, created_at, id''', (user_id,)).fetchall()
+        else:
+            rows = db.execute(f'''SELECT {GOAL_COLUMNS} FROM goals WHERE user_id = ? AND depth <= ?
+                ORDER BY depth, created_at, id''', (user_id, depth)).fetchall()
+    
+    return jsonify({'goals': build_goal_tree(rows)})
+
+@app.route('/api/goals/<int:goal_id>', methods=['GET'])
+@require_user
+@conditional('goals')
+def get_goal_subtree(user_id, goal_id):
+    """One goal with its descendants; ?depth=N limits it to N levels below the goal"""
+    depth = _int_arg('depth')
+    with get_db() as db:
+        root = _goal_path(db, user_id, goal_id)
+        if root is None:
+            return jsonify({'error': 'Goal not found'}), 404
+        low, high = subtree_range(root['path'])
+        max_depth = root['depth'] + depth if depth is not None else 1 << 30
+        rows = db.execute(f'''SELECT {GOAL_COLUMNS} FROM goals
+            WHERE user_id = ? AND path >= ? AND path < ? AND depth <= ?
+            ORDER BY depth, created_at, id''', (user_id, low, high, max_depth)).fetchall()
+    
+    return jsonify({'goal': build_goal_tree(rows)[0]})
+
+@app.route('/api/goals/progress', methods=['GET'])
+@require_user
+@conditional('goals')
+def get_goal_progress(user_id):
+    """Completion per goal from its stored roll-up counts.
+    
+    percent is the share of descendants completed; for a goal without
+    descendants it is 100 or 0 from the goal itself. ?root=<id> limits the
+    report to one subtree.
+    """
+    root_id = _int_arg('root')
+    low, high = '/', '0'
+    with get_db() as db:
+        if root_id is not None:
+            root = _goal_path(db, user_id, root_id)
+            if root is None:
+                return jsonify({'error': 'Goal not found'}), 404
+            low, high = subtree_range(root['path'])
+        rows = db.execute(f'''SELECT id, parent_id, title, depth, completed, descendants, completed_descendants,
+                   {GOAL_PERCENT}
+            FROM goals WHERE user_id = ? AND path >= ? AND path < ?
+            ORDER BY path''', (user_id, low, high)).fetchall()
+    
+    return jsonify({'progress': [dict(row) for row in rows]})
+
+def _ancestor_ids(path):
+    """Ids of a goal's ancestors, read off its materialized path"""
+    return [int(part) for part in path.strip('/').split('/')[:-1]]
+
+def _bump_ancestors(db, user_id, path, total, completed):
+    """Add to the roll-up counts of every ancestor of the goal at path: O(depth) key lookups"""
+    ids = _ancestor_ids(path)
+    if ids and (total or completed):
+        db.execute(f'''UPDATE goals SET descendants = descendants + ?, completed_descendants = completed_descendants + ?
+            WHERE user_id = ? AND id IN ({', '.join('?' * len(ids))})''', (total, completed, user_id, *ids))
+
+def _load_goal(db, user_id, goal_id):
+    row = db.execute(f'SELECT {GOAL_COLUMNS} FROM goals WHERE id = ? AND user_id = ?', (goal_id, user_id)).fetchone()
+    return dict(row) if row else None
+
+def _goal_fields(data):
+    """Validated goal attributes present in a request body; raises ValueError"""
+    fields = {}
+    if 'title' in data:
+        fields['title'] = sanitize(data.get('title'), 200)
+        if not fields['title']:
+            raise ValueError('Title required')
+    if 'description' in data:
+        fields['description'] = sanitize(data.get('description'), 2000)
+    if 'type' in data:
+        fields['type'] = sanitize(data.get('type'), 50) or 'goal'
+    if 'priority' in data:
+        fields['priority'] = str(data.get('priority') or 'medium').lower()
+        if fields['priority'] not in PRIORITIES:
+            raise ValueError(f"priority must be one of {', '.join(PRIORITIES)}")
+    if 'completed' in data:
+        fields['completed'] = int(bool(data['completed']))
+    if 'parent_id' in data:
+        parent_id = data['parent_id']
+        if parent_id is not None and (not isinstance(parent_id, int) or isinstance(parent_id, bool)):
+            raise ValueError('parent_id must be a goal id or null')
+        fields['parent_id'] = parent_id
+    return fields
+
+@app.route('/api/goals', methods=['POST'])
+@require_user
+def create_goal(user_id):
+    data = request.get_json(silent=True) or {}
+    try:
+        fields = _goal_fields(data)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    if not fields.get('title'):
+        return jsonify({'error': 'Title required'}), 400
     
-    goal_map = {g['id']: g for g in goals}
-    for g in goals:
-        g['children'] = []
+    with write_transaction() as db:
+        parent_id = fields.get('parent_id')
+        if parent_id is not None and _goal_path(db, user_id, parent_id) is None:
+            return jsonify({'error': 'Parent goal not found'}), 400
+        columns = ['user_id'] + list(fields)
+        cursor = db.execute(f'''INSERT INTO goals ({', '.join(columns)})
+            VALUES ({', '.join('?' * len(columns))})''', (user_id, *fields.values()))
+        goal_id = cursor.lastrowid
+        goal = _goal_path(db, user_id, goal_id)
+        _bump_ancestors(db, user_id, goal['path'], 1, fields.get('completed', 0))
+        bump_version(db, user_id, 'goals')
+        return jsonify({'goal': _load_goal(db, user_id, goal_id)}), 201
+
+@app.route('/api/goals/<int:goal_id>', methods=['PATCH'])
+@require_user
+def update_goal(user_id, goal_id):
+    """Edit, complete or move a goal; ancestors' roll-ups are adjusted in the same transaction"""
+    data = request.get_json(silent=True) or {}
+    try:
+        fields = _goal_fields(data)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     
-    root_goals = []
-    for g in goals:
-        if g['parent_id'] and g['parent_id'] in goal_map:
-            goal_map[g['parent_id']]['children'].append(g)
-        elif not g['parent_id']:
-            root_goals.append(g)
+    with write_transaction() as db:
+        goal = db.execute('''SELECT parent_id, path, completed, descendants, completed_descendants
+            FROM goals WHERE id = ? AND user_id = ?''', (goal_id, user_id)).fetchone()
+        if goal is None:
+            return jsonify({'error': 'Goal not found'}), 404
+        
+        moving = 'parent_id' in fields and fields['parent_id'] != goal['parent_id']
+        if moving and fields['parent_id'] is not None:
+            parent = _goal_path(db, user_id, fields['parent_id'])
+            if parent is None:
+                return jsonify({'error': 'Parent goal not found'}), 400
+            low, high = subtree_range(goal['path'])
+            if low <= parent['path'] < high:
+                return jsonify({'error': 'A goal cannot be moved under itself or its descendants'}), 400
+        
+        completed = fields.get('completed', goal['completed'])
+        if moving:
+            _bump_ancestors(db, user_id, goal['path'], -(1 + goal['descendants']),
+                            -(goal['completed'] + goal['completed_descendants']))
+        if fields:
+            db.execute(f"UPDATE goals SET {', '.join(f'{k} = ?' for k in fields)} WHERE id = ?",
+                       (*fields.values(), goal_id))
+        if moving:
+            path = _goal_path(db, user_id, goal_id)['path']
+            _bump_ancestors(db, user_id, path, 1 + goal['descendants'], completed + goal['completed_descendants'])
+        elif completed != goal['completed']:
+            _bump_ancestors(db, user_id, goal['path'], 0, completed - goal['completed'])
+        bump_version(db, user_id, 'goals')
+        
+        return jsonify({'goal': _load_goal(db, user_id, goal_id)})
+
+@app.route('/api/goals/<int:goal_id>', methods=['DELETE'])
+@require_user
+def delete_goal(user_id, goal_id):
+    """Delete a goal and its whole subtree"""
+    with write_transaction() as db:
+        goal = db.execute('''SELECT path, completed, descendants, completed_descendants
+            FROM goals WHERE id = ? AND user_id = ?''', (goal_id, user_id)).fetchone()
+        if goal is None:
+            return jsonify({'error': 'Goal not found'}), 404
+        low, high = subtree_range(goal['path'])
+        deleted = db.execute('DELETE FROM goals WHERE user_id = ? AND path >= ? AND path < ?',
+                             (user_id, low, high)).rowcount
+        _bump_ancestors(db, user_id, goal['path'], -(1 + goal['descendants']),
+                        -(goal['completed'] + goal['completed_descendants']))
+        bump_version(db, user_id, 'goals')
     
-    return jsonify({'goals': root_goals})
+    return jsonify({'success': True, 'deleted': deleted})
 
 @app.route('/api/health', methods=['GET'])
 def health_check():
@@ -505,9 +2992,173 @@ def health_check():
         'status': 'healthy',
         'ai_enabled': config.AI_ENABLED,
         'ai_provider': config.AI_PROVIDER or 'fallback',
+        'db_pool': db_pool.stats(),
+        'user_cache': user_cache.stats(),
+        'schedule_cache': schedule_cache.stats(),
+        'chat_buffer': chat_buffer.stats(),
+        'ai_status': ai_provider.status() if ai_provider else None,
+        'ai_latency': ai_provider.latency_stats() if ai_provider else {},
+        'prompt': prompt_metrics.stats(),
+        'schedule_parse': schedule_parse_stats.stats(),
+        'schedule_jobs': schedule_jobs.stats(),
+        'schedule_flights': schedule_flights.stats(),
+        'conditional_get': conditional_stats.stats(),
+        'json_provider': type(app.json).__name__,
+        'compression': compression_stats.stats(),
         'timestamp': datetime.now().isoformat()
     })
 
+# ================================
+# ASGI APP
+# ================================
+
+db_executor = ThreadPoolExecutor(max_workers=config.DB_POOL_SIZE, thread_name_prefix='focusflow-db')
+
+async def run_db(fn, *args):
+    """Run blocking database work on the DB thread pool"""
+    return await asyncio.get_running_loop().run_in_executor(db_executor, fn, *args)
+
+if ASGI_AVAILABLE:
+    class PooledWsgiInstance(WsgiToAsgiInstance):
+        """asgiref WSGI instance that runs the app on a sized thread pool.
+        
+        The stock adapter is thread-sensitive, so every Flask request shares
+        one thread and a long-poll or SSE stream blocks `/api/health`.
+        """
+        
+        def __init__(self, wsgi_application, executor):
+            super().__init__(wsgi_application)
+            self.executor = executor
+        
+        async def run_wsgi_app(self, body):
+            await sync_to_async(self.serve, thread_sensitive=False, executor=self.executor)(body)
+        
+        def serve(self, body):
+            environ = self.build_environ(self.scope, body)
+            response = self.wsgi_application(environ, self.start_response)
+            try:
+                for output in response:
+                    if not self.response_started:
+                        self.response_started = True
+                        self.sync_send(self.response_start)
+                    self.sync_send({'type': 'http.response.body', 'body': output, 'more_body': True})
+            finally:
+                if hasattr(response, 'close'):
+                    response.close()
+            if not self.response_started:
+                self.response_started = True
+                self.sync_send(self.response_start)
+            self.sync_send({'type': 'http.response.body'})
+
+class AsyncAPI:
+    """ASGI entry point for `SERVER_MODE=asgi`.
+    
+    The AI-bound routes are served natively: a slow chat call only holds a
+    coroutine, and schedule requests await their job's result without
+    holding a thread. Every other request is handed to the Flask app on a
+    pool of ASGI_WSGI_THREADS threads.
+    """
+    
+    def __init__(self, wsgi_app):
+        self.wsgi_app = wsgi_app
+        self.wsgi_executor = ThreadPoolExecutor(max_workers=config.ASGI_WSGI_THREADS,
+                                                thread_name_prefix='focusflow-wsgi')
+        self.routes = {
+            ('POST', '/api/chat'): self.chat,
+            ('POST', '/api/generate-schedule'): self.generate_schedule,
+        }
+    
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            while True:
+                message = await receive()
+                if message['type'] == 'lifespan.startup':
+                    await run_db(schedule_jobs.start)
+                    await send({'type': 'lifespan.startup.complete'})
+                elif message['type'] == 'lifespan.shutdown':
+                    db_executor.shutdown(wait=False)
+                    self.wsgi_executor.shutdown(wait=False)
+                    await send({'type': 'lifespan.shutdown.complete'})
+                    return
+        
+        handler = self.routes.get((scope.get('method'), scope.get('path')))
+        if handler is None:
+            return await PooledWsgiInstance(self.wsgi_app, self.wsgi_executor)(scope, receive, send)
+        
+        body = b''
+        while True:
+            message = await receive()
+            body += message.get('body', b'')
+            if not message.get('more_body'):
+                break
+        
+        headers = {k.decode('latin-1').lower(): v.decode('latin-1') for k, v in scope['headers']}
+        try:
+            data = json.loads(body or b'{}')
+        except ValueError:
+            data = {}
+        
+        user_id = await run_db(get_or_create_user, headers.get('x-user', 'demo_user'))
+        try:
+            status, payload = await handler(user_id, data)
+        except Exception as e:
+            logger.error(f"ASGI {scope['path']} error: {e}")
+            status, payload = 500, {'error': 'Internal server error'}
+        await self.send_json(send, status, payload)
+    
+    @staticmethod
+    async def send_json(send, status, payload):
+        body = app.json.dumps(payload).encode()
+        await send({
+            'type': 'http.response.start',
+            'status': status,
+            'headers': [
+                (b'content-type', b'application/json'),
+                (b'content-length', str(len(body)).encode()),
+                (b'access-control-allow-origin', b'*'),
+            ]
+        })
+        await send({'type': 'http.response.body', 'body': body})
+    
+    async def chat(self, user_id, data):
+        message = sanitize(data.get('message', ''), 2000)
+        if not message:
+            return 400, {'error': 'Message required'}
+        
+        history, summary = await run_db(begin_chat_turn, user_id, message)
+        
+        ai_response = None
+        try:
+            if config.AI_ENABLED:
+                ai_response = await get_ai_chat_response_async(message, history, summary)
+        finally:
+            # Also runs on cancellation (client disconnect)
+            ai_response = ai_response or fallback_chat_response(history)
+            message_id = await run_db(finish_chat_turn, user_id, message, ai_response)
+        
+        return 200, {'response': ai_response, 'id': message_id, 'timestamp': datetime.now().isoformat()}
+    
+    async def generate_schedule(self, user_id, data):
+        workflow = sanitize(data.get('workflow', ''), 5000)
+        if not workflow:
+            return 400, {'error': 'Workflow required'}
+        
+        job_id, future = await run_db(schedule_jobs.submit, user_id, workflow)
+        if data.get('async'):
+            return 202, job_accepted(job_id)
+        
+        try:
+            payload = await asyncio.wait_for(asyncio.shield(asyncio.wrap_future(future)),
+                                             config.AI_SCHEDULE_DEADLINE + 5)
+        except asyncio.TimeoutError:
+            return 202, job_accepted(job_id)
+        if payload is None:
+            return 500, {'error': 'Schedule generation failed', 'job_id': job_id}
+        return 200, payload
+
+# `uvicorn backend:asgi_app` when asgiref/uvicorn are installed
+asgi_app = AsyncAPI(app) if ASGI_AVAILABLE else None
+
 # ================================
 # RUN
 # ================================
@@ -523,8 +3174,13 @@ if __name__ == '__main__':
     else:
         print("/ AI Provider: Fallback (no API needed)")
         print("/ Cost: $0.00")
-    print(f"/ Server: http://localhost:{config.PORT}")
+    print(f"/ Server: http://localhost:{config.PORT} ({config.SERVER_MODE.upper()})")
     print("=" * 60)
     
-    app.run(debug=True, host='0.0.0.0', port=config.PORT, threaded=True)
+    if config.SERVER_MODE == 'asgi':
+        if not ASGI_AVAILABLE:
+            raise SystemExit("ASGI mode needs asgiref and uvicorn. Run: pip install asgiref uvicorn")
+        uvicorn.run(asgi_app, host='0.0.0.0', port=config.PORT)
+    else:
+        app.run(debug=True, host='0.0.0.0', port=config.PORT, threaded=True)
 
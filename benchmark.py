@@ -0,0 +1,320 @@
+"""
+FocusFlow-AI Benchmarks
+=======================================
+
+Usage:
+    python benchmark.py sqlite [--seconds 5] [--readers 4] [--writers 4]
+    python benchmark.py api [--requests 500] [--concurrency 16] [--ai-latency 0.2]
+    python benchmark.py json [--messages 200] [--goals 2000] [--iterations 200]
+"""
+
+import argparse
+import http.client
+import json
+import logging
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+# Point the backend at a throwaway database before it is imported
+_tmpdir = tempfile.mkdtemp(prefix='focusflow-bench-')
+os.environ.setdefault('DATABASE', os.path.join(_tmpdir, 'bench.db'))
+
+import backend  # noqa: E402
+
+# ================================
+# HELPERS
+# ================================
+
+def print_table(title, rows, columns):
+    """Print rows (dicts) with the first column left-aligned as the label"""
+    label, *metrics = columns
+    width = max([len(label)] + [len(str(row[label])) for row in rows]) + 2
+    print(f"\n{title}")
+    print("-" * (width + 14 * len(metrics)))
+    print(f"{label:<{width}}" + "".join(f"{c:>14}" for c in metrics))
+    for row in rows:
+        print(f"{row[label]:<{width}}" + "".join(f"{row.get(c, 0):>14.1f}" for c in metrics))
+
+# ================================
+# SQLITE PROFILE
+# ================================
+
+DEFAULT_PROFILE = {'journal_mode': 'DELETE', 'synchronous': 'FULL'}
+
+def _sqlite_worker(path, pragmas, fn, stop, counts, errors):
+    conn = sqlite3.connect(path, timeout=pragmas.get('busy_timeout', 5000) / 1000)
+    backend.apply_sqlite_profile(conn, {k: v for k, v in pragmas.items() if k != 'journal_mode'})
+    n = 0
+    while not stop.is_set():
+        try:
+            fn(conn)
+            n += 1
+        except sqlite3.OperationalError:
+            errors.append(1)
+    conn.close()
+    counts.append(n)
+
+def _chat_write(conn):
+    conn.execute('INSERT INTO chat_history (user_id, role, content) VALUES (?, ?, ?)',
+                 (1, 'user', 'benchmark message ' * 8))
+    conn.commit()
+
+def _schedule_read(conn):
+    row = conn.execute('SELECT id FROM schedules WHERE user_id = ? AND week_start = ?',
+                       (1, '2026-01-05')).fetchone()
+    conn.execute('SELECT * FROM study_blocks WHERE schedule_id = ? ORDER BY day_of_week, start_time',
+                 (row[0],)).fetchall()
+
+def run_sqlite_profile(name, pragmas, seconds, readers, writers):
+    path = os.path.join(_tmpdir, f'profile-{name}.db')
+    for suffix in ('', '-wal', '-shm'):
+        if os.path.exists(path + suffix):
+            os.remove(path + suffix)
+    
+    # Reuse the backend schema under this profile, then seed one schedule to read back
+    backend.config.DATABASE = path
+    saved, backend.config.SQLITE_PRAGMAS = backend.config.SQLITE_PRAGMAS, pragmas
+    backend.db_pool.close_all()
+    backend.init_db()
+    backend.db_pool.close_all()
+    backend.config.SQLITE_PRAGMAS = saved
+    with sqlite3.connect(path) as conn:
+        conn.execute("INSERT INTO schedules (user_id, week_start) VALUES (1, '2026-01-05')")
+        conn.executemany('''INSERT INTO study_blocks
+            (schedule_id, day_of_week, start_time, end_time, subject) VALUES (1, ?, ?, ?, ?)''',
+            [(d % 5, '9:00 AM', '11:00 AM', 'Math') for d in range(20)])
+    
+    stop = threading.Event()
+    read_counts, write_counts, errors = [], [], []
+    threads = (
+        [threading.Thread(target=_sqlite_worker, args=(path, pragmas, _schedule_read, stop, read_counts, errors))
+         for _ in range(readers)] +
+        [threading.Thread(target=_sqlite_worker, args=(path, pragmas, _chat_write, stop, write_counts, errors))
+         for _ in range(writers)]
+    )
+    for t in threads:
+        t.start()
+    time.sleep(seconds)
+    stop.set()
+    for t in threads:
+        t.join()
+    
+    return {
+        'profile': name,
+        'reads/s': sum(read_counts) / seconds,
+        'writes/s': sum(write_counts) / seconds,
+        'busy errors': float(len(errors)),
+    }
+
+def bench_sqlite(args):
+    rows = [
+        run_sqlite_profile('default', DEFAULT_PROFILE, args.seconds, args.readers, args.writers),
+        run_sqlite_profile('tuned', backend.config.SQLITE_PRAGMAS, args.seconds, args.readers, args.writers),
+    ]
+    print_table(f"SQLite profile: {args.readers} readers / {args.writers} writers, {args.seconds}s",
+                rows, ['profile', 'reads/s', 'writes/s', 'busy errors'])
+
+# ================================
+# API LOAD TEST
+# ================================
+
+def percentile(sorted_values, p):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(round(p / 100 * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+def install_stub_ai(latency):
+    """Switch the backend to the offline stub provider with the given latency (seconds)"""
+    backend.config.AI_PROVIDER = 'stub'
+    backend.config.AI_MODEL = 'echo'
+    backend.config.STUB_AI_LATENCY = latency
+    backend.ai_provider = backend.StubProvider(backend.config)
+    backend.config.AI_ENABLED = True
+
+def start_server():
+    from werkzeug.serving import make_server
+    # Per-request access logs and tracebacks would swamp the report; errors are counted instead
+    logging.getLogger('werkzeug').setLevel(logging.WARNING)
+    backend.app.logger.setLevel(logging.CRITICAL)
+    server = make_server('127.0.0.1', 0, backend.app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+def run_route(port, method, path, body_fn, requests, concurrency, users):
+    """Fire `requests` calls at one route from `concurrency` keep-alive clients"""
+    local = threading.local()
+    
+    def call(i):
+        conn = getattr(local, 'conn', None)
+        if conn is None:
+            conn = local.conn = http.client.HTTPConnection('127.0.0.1', port, timeout=60)
+        body = json.dumps(body_fn(i)) if body_fn else None
+        headers = {'Content-Type': 'application/json', 'X-User': f'bench{i % users}'}
+        start = time.perf_counter()
+        try:
+            conn.request(method, path, body=body, headers=headers)
+            response = conn.getresponse()
+            response.read()
+            ok = response.status < 400
+        except (OSError, http.client.HTTPException):
+            local.conn = None
+            ok = False
+        return time.perf_counter() - start, ok
+    
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(call, range(requests)))
+    elapsed = time.perf_counter() - start
+    
+    latencies = sorted(t * 1000 for t, _ in results)
+    return {
+        'route': f'{method} {path}',
+        'req/s': requests / elapsed,
+        'p50 ms': percentile(latencies, 50),
+        'p95 ms': percentile(latencies, 95),
+        'p99 ms': percentile(latencies, 99),
+        'errors': float(sum(1 for _, ok in results if not ok)),
+    }
+
+def bench_api(args):
+    install_stub_ai(args.ai_latency)
+    server = start_server()
+    port = server.server_port
+    
+    # Unique workflow text per request so the schedule cache does not hide the AI call
+    workflow = (lambda i: {'workflow': 'math and physics, mornings'}) if args.repeat_workflows else \
+               (lambda i: {'workflow': f'math and physics, mornings (request {i})'})
+    routes = [
+        ('POST', '/api/chat', lambda i: {'message': f'How should I study? ({i})'}),
+        ('GET', '/api/chat/history?limit=50', None),
+        ('POST', '/api/generate-schedule', workflow),
+        ('GET', '/api/schedule', None),
+        ('GET', '/api/goals', None),
+    ]
+    
+    rows = []
+    try:
+        for method, path, body_fn in routes:
+            rows.append(run_route(port, method, path, body_fn, args.requests, args.concurrency, args.users))
+    finally:
+        server.shutdown()
+    
+    print_table(f"API: {args.requests} requests/route, concurrency {args.concurrency}, "
+                f"stub AI latency {args.ai_latency * 1000:.0f}ms",
+                rows, ['route', 'req/s', 'p50 ms', 'p95 ms', 'p99 ms', 'errors'])
+
+# ================================
+# JSON ENCODING AND COMPRESSION
+# ================================
+
+AI_REPLY = ("Try splitting calculus into 45-minute blocks on Monday, Wednesday and Friday mornings, "
+            "starting each one with ten minutes of active recall on the previous session. Keep "
+            "physics problem sets for the afternoon, when worked examples matter more than focus. ")
+
+def seed_payload_user(username, messages, goals):
+    """Give one user a long chat history (AI-length replies) and a wide goal tree"""
+    user_id = backend.get_or_create_user(username)
+    with backend.get_db() as db:
+        db.executemany('INSERT INTO chat_history (user_id, role, content) VALUES (?, ?, ?)',
+                       [(user_id, 'user' if i % 2 == 0 else 'assistant',
+                         f'How do I plan week {i}?' if i % 2 == 0 else AI_REPLY * 2) for i in range(messages)])
+        goal_ids = []
+        for i in range(goals):
+            parent_id = goal_ids[(i - 4) // 4] if i >= 4 else None  # four roots, fan-out of four
+            cursor = db.execute('INSERT INTO goals (user_id, title, description, parent_id) VALUES (?, ?, ?, ?)',
+                                (user_id, f'Goal {i}', 'Finish the chapter exercises and review notes', parent_id))
+            goal_ids.append(cursor.lastrowid)
+    return user_id
+
+def time_per_call(fn, iterations):
+    fn()
+    start = time.perf_counter()
+    for _ in range(iterations):
+        fn()
+    return (time.perf_counter() - start) / iterations
+
+def bench_json(args):
+    from flask.json.provider import DefaultJSONProvider
+    
+    app = backend.app
+    providers = {'std': DefaultJSONProvider(app)}
+    if backend.ORJSON_AVAILABLE:
+        providers['orjson'] = backend.OrjsonProvider(app)
+    encodings = [None, 'gzip'] + (['br'] if backend.BROTLI_AVAILABLE else [])
+    routes = {'chat history': '/api/chat/history?limit=200', 'goals': '/api/goals'}
+    
+    backend.config.AI_ENABLED = False
+    headers = {'X-User': 'bench-json'}
+    seed_payload_user(headers['X-User'], args.messages, args.goals)
+    client = app.test_client()
+    payloads = {name: client.get(path, headers=headers).get_json() for name, path in routes.items()}
+    
+    rows = []
+    with app.app_context():
+        for name, payload in payloads.items():
+            for provider_name, provider in providers.items():
+                body = provider.response(payload).get_data()
+                rows.append({
+                    'payload': f'{name} / {provider_name}',
+                    'KiB': len(body) / 1024,
+                    'encode us': time_per_call(lambda: provider.response(payload).get_data(), args.iterations) * 1e6,
+                })
+            for encoding in encodings[1:]:
+                rows.append({
+                    'payload': f'{name} / {encoding} L{backend.config.GZIP_LEVEL if encoding == "gzip" else backend.config.BROTLI_QUALITY}',
+                    'KiB': len(backend.compress_body(body, encoding)) / 1024,
+                    'encode us': time_per_call(lambda: backend.compress_body(body, encoding), args.iterations) * 1e6,
+                })
+    print_table(f"Serialization: {args.messages} chat messages, {args.goals} goals", rows,
+                ['payload', 'KiB', 'encode us'])
+    
+    rows = []
+    for name, path in routes.items():
+        for provider_name, provider in providers.items():
+            app.json = provider
+            for encoding in encodings:
+                request_headers = dict(headers, **({'Accept-Encoding': encoding} if encoding else {}))
+                size = len(client.get(path, headers=request_headers).data)
+                rows.append({
+                    'route': f'{name} / {provider_name} / {encoding or "identity"}',
+                    'KiB sent': size / 1024,
+                    'ms/request': time_per_call(lambda: client.get(path, headers=request_headers),
+                                                max(1, args.iterations // 10)) * 1000,
+                })
+    print_table("Full request (test client, includes the SQLite query)", rows, ['route', 'KiB sent', 'ms/request'])
+
+# ================================
+# RUN
+# ================================
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='FocusFlow-AI benchmarks')
+    sub = parser.add_subparsers(dest='command', required=True)
+    
+    p = sub.add_parser('sqlite', help='concurrent read/write throughput per SQLite profile')
+    p.add_argument('--seconds', type=float, default=5)
+    p.add_argument('--readers', type=int, default=4)
+    p.add_argument('--writers', type=int, default=4)
+    p.set_defaults(func=bench_sqlite)
+    
+    p = sub.add_parser('api', help='latency and throughput of every /api route against a stub AI provider')
+    p.add_argument('--requests', type=int, default=500, help='requests per route')
+    p.add_argument('--concurrency', type=int, default=16)
+    p.add_argument('--users', type=int, default=20, help='distinct X-User values')
+    p.add_argument('--ai-latency', type=float, default=0.2, help='stub provider latency in seconds')
+    p.add_argument('--repeat-workflows', action='store_true', help='send identical workflow text (exercises caches)')
+    p.set_defaults(func=bench_api)
+    
+    p = sub.add_parser('json', help='JSON encoding and response compression cost on large payloads')
+    p.add_argument('--messages', type=int, default=200, help='chat messages (the history route returns up to 200)')
+    p.add_argument('--goals', type=int, default=2000)
+    p.add_argument('--iterations', type=int, default=200)
+    p.set_defaults(func=bench_json)
+    
+    args = parser.parse_args()
+    args.func(args)
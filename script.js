@@ -98,6 +98,7 @@ function addMessage(content, isUser = false) {
     messageDiv.appendChild(messageContent);
     chatMessages.appendChild(messageDiv);
     chatMessages.scrollTop = chatMessages.scrollHeight;
+    return messageContent.querySelector('p');
 }
 
 function showTypingIndicator() {
@@ -130,7 +131,19 @@ function removeTypingIndicator() {
     if (typingIndicator) typingIndicator.remove();
 }
 
+// Newest chat_history id on screen; null until the first full load
+let lastChatId = null;
+
 async function loadChatHistory() {
+    if (lastChatId !== null) {
+        const data = await apiCall(`/chat/history?after_id=${lastChatId}&limit=200`);
+        if (data && data.history) {
+            data.history.forEach(msg => addMessage(msg.content, msg.role === 'user'));
+            lastChatId = data.latest_id;
+        }
+        return;
+    }
+    
     const data = await apiCall('/chat/history?limit=50');
     if (data && data.history) {
         const messages = chatMessages.querySelectorAll('.message');
@@ -144,9 +157,71 @@ async function loadChatHistory() {
                 addMessage(msg.content, msg.role === 'user');
             }
         });
+        lastChatId = data.latest_id || 0;
     }
 }
 
+// Messages sent from this page are already shown; skip past them on the next refresh
+function markChatSeen(id) {
+    if (lastChatId !== null && id) lastChatId = Math.max(lastChatId, id);
+}
+
+const CHAT_FALLBACK = "I'm here to help! Try the Pomodoro Technique: 25min work, 5min break.";
+
+// Streams /chat/stream (Server-Sent Events) into a new AI message.
+// Returns false only if the stream request itself failed, so the caller can
+// fall back to /chat; once it is accepted the server saves the turn, even if
+// the stream later breaks off.
+async function streamChat(message) {
+    let response;
+    try {
+        response = await fetch(`${API_BASE_URL}/chat/stream`, {
+            method: 'POST',
+            headers: { 'Content-Type': 'application/json', 'X-User': 'demo_user' },
+            body: JSON.stringify({ message })
+        });
+    } catch (error) {
+        console.error('Chat stream failed:', error);
+        return false;
+    }
+    if (!response.ok || !response.body) return false;
+    
+    removeTypingIndicator();
+    const textEl = addMessage('');
+    const reader = response.body.getReader();
+    const decoder = new TextDecoder();
+    let buffer = '';
+    let text = '';
+    
+    try {
+        while (true) {
+            const { value, done } = await reader.read();
+            if (done) break;
+            buffer += decoder.decode(value, { stream: true });
+            
+            const events = buffer.split('\n\n');
+            buffer = events.pop();
+            events.forEach(raw => {
+                const event = (raw.match(/^event: (.*)$/m) || [])[1];
+                const data = (raw.match(/^data: (.*)$/m) || [])[1];
+                if (!data) return;
+                const payload = JSON.parse(data);
+                if (event === 'token') text += payload.text;
+                if (event === 'done') {
+                    text = payload.response;
+                    markChatSeen(payload.id);
+                }
+                textEl.textContent = text;
+                chatMessages.scrollTop = chatMessages.scrollHeight;
+            });
+        }
+    } catch (error) {
+        console.error('Chat stream interrupted:', error);
+    }
+    if (text === '') textEl.textContent = CHAT_FALLBACK;
+    return true;
+}
+
 async function sendMessage() {
     const message = chatInput.value.trim();
     if (message === '') return;
@@ -155,6 +230,8 @@ async function sendMessage() {
     chatInput.value = '';
     showTypingIndicator();
     
+    if (await streamChat(message)) return;
+    
     const data = await apiCall('/chat', {
         method: 'POST',
         body: JSON.stringify({ message })
@@ -164,8 +241,9 @@ async function sendMessage() {
     
     if (data && data.response) {
         addMessage(data.response);
+        markChatSeen(data.id);
     } else {
-        addMessage("I'm here to help! Try the Pomodoro Technique: 25min work, 5min break.");
+        addMessage(CHAT_FALLBACK);
     }
 }
 
@@ -237,6 +315,29 @@ function createStudyBlockElement(block) {
 const workflowInput = document.querySelector('.workflow-input');
 const submitBtn = document.querySelector('.submit-btn');
 
+// Generation runs as a background job; long-poll its status until it
+// finishes, giving up (error state) after SCHEDULE_TIMEOUT_MS
+const SCHEDULE_TIMEOUT_MS = 120000;
+
+async function generateSchedule(workflowText) {
+    const job = await apiCall('/generate-schedule', {
+        method: 'POST',
+        body: JSON.stringify({ workflow: workflowText, async: true })
+    });
+    if (!job || !job.job_id) return null;
+    
+    const deadline = Date.now() + SCHEDULE_TIMEOUT_MS;
+    while (Date.now() < deadline) {
+        const wait = Math.max(1, Math.min(25, Math.floor((deadline - Date.now()) / 1000)));
+        const status = await apiCall(`/schedule-jobs/${job.job_id}?wait=${wait}`);
+        if (!status || status.status === 'failed') return null;
+        if (status.status === 'done') {
+            return { success: true, schedule_id: status.schedule_id, schedule_data: status.schedule_data };
+        }
+    }
+    return null;
+}
+
 submitBtn.addEventListener('click', async () => {
     const workflowText = workflowInput.value.trim();
     
@@ -249,10 +350,7 @@ submitBtn.addEventListener('click', async () => {
     submitBtn.disabled = true;
     submitBtn.textContent = 'Generating...';
     
-    const data = await apiCall('/generate-schedule', {
-        method: 'POST',
-        body: JSON.stringify({ workflow: workflowText })
-    });
+    const data = await generateSchedule(workflowText);
     
     submitBtn.disabled = false;
     
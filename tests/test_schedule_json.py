@@ -0,0 +1,71 @@
+import os
+import sys
+import tempfile
+import unittest
+
+# backend migrates its database on import; point it at a scratch file
+os.environ['DATABASE'] = os.path.join(tempfile.mkdtemp(), 'test.db')
+os.environ['AI_PROVIDER'] = 'stub'
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import backend  # noqa: E402
+
+HAMLET = '{"blocks":[[0,"9:00 AM","10:00 AM","English","Read “Hamlet” Act 1","high"]]}'
+
+
+class RepairJSONTest(unittest.TestCase):
+    def test_keeps_curly_quotes_inside_strings(self):
+        self.assertEqual(backend.repair_json('{"t": "say “hi”",}'), '{"t": "say “hi”"}')
+
+    def test_curly_quoted_strings(self):
+        self.assertEqual(backend.repair_json('{“name”: “Math”}'), '{"name": "Math"}')
+
+    def test_comments_literals_and_trailing_commas(self):
+        repaired = backend.repair_json('{// plan\n"a": [1, 2,], "b": True, "c": None /* x */}')
+        self.assertEqual(backend.json.loads(repaired), {'a': [1, 2], 'b': True, 'c': None})
+
+    def test_raw_newline_in_string(self):
+        self.assertEqual(backend.json.loads(backend.repair_json('{"t": "a\nb"}')), {'t': 'a\nb'})
+
+    def test_truncated_output_cut_to_last_complete_element(self):
+        repaired = backend.repair_json('{"a": [1, 2], "b": [3, "fou')
+        self.assertEqual(backend.json.loads(repaired), {'a': [1, 2], 'b': [3]})
+
+
+class ParseScheduleJSONTest(unittest.TestCase):
+    def test_valid_json_with_curly_quotes_in_values(self):
+        schedule = backend.parse_schedule_json(HAMLET)
+        self.assertEqual(schedule['study_blocks'][0]['topic'], 'Read “Hamlet” Act 1')
+
+    def test_prose_and_code_fence_around_object(self):
+        text = 'Here you go:\n```json\n' + HAMLET + '\n```\nGood luck {really}!'
+        self.assertEqual(len(backend.parse_schedule_json(text)['study_blocks']), 1)
+
+    def test_truncated_output(self):
+        text = ('{"subjects":[["Math","high",6]],"blocks":[[0,"9:00 AM","10:00 AM","Math","Algebra","high"],'
+                '[1,"9:00 AM","10:0')
+        schedule = backend.parse_schedule_json(text)
+        self.assertEqual([b['subject'] for b in schedule['study_blocks']], ['Math'])
+        self.assertEqual(schedule['subjects'][0]['hours_per_week'], 6)
+
+    def test_streamed_chunks_match_whole_reply(self):
+        extractor = backend.ScheduleJSONExtractor()
+        for i in range(0, len(HAMLET), 7):
+            extractor.feed(HAMLET[i:i + 7])
+        self.assertEqual(extractor.result(), backend.parse_schedule_json(HAMLET))
+        self.assertFalse(extractor.repaired)
+
+    def test_non_finite_or_invalid_hours_become_zero(self):
+        text = ('{"subjects":[["Math","high","nan"],["Art","low","inf"],["Bio","low","lots"]],'
+                '"blocks":[[0,"9:00 AM","10:00 AM","Math","","high"]]}')
+        schedule = backend.parse_schedule_json(text)
+        self.assertEqual([s['hours_per_week'] for s in schedule['subjects']], [0, 0, 0])
+
+    def test_no_usable_blocks_raises(self):
+        for text in ('no json here', '{"study_blocks": []}', '{"blocks": [{"day": "Monday"}]}'):
+            with self.assertRaises(ValueError):
+                backend.parse_schedule_json(text)
+
+
+if __name__ == '__main__':
+    unittest.main()